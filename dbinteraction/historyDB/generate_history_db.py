@@ -0,0 +1,110 @@
+"""Fills a SQLite history database with made up MPS history messages.
+
+The messages look like the ones on the production history database,
+in about the same mix of message types, so the SQLiteHistoryBackend
+can stand in for Oracle when measuring history performance.
+
+Usage:
+    python -m dbinteraction.historyDB.generate_history_db history.sqlite --hours 24
+"""
+import random
+import time
+from argparse import ArgumentParser
+from sqlalchemy import create_engine, text
+from dbinteraction.historyDB.history_backend import create_history_tables
+from mps_constants import FROM_1970_TO_1990_IN_SECONDS
+
+MESSAGE_MIX = {'F': 0.70, 'BV': 0.12, 'BR': 0.09, 'BT': 0.08, 'BD': 0.01}
+"""Share of each message type among all history messages"""
+MESSAGES_PER_HOUR = 2000
+"""Default amount of messages generated for each hour"""
+
+AREAS = ['GUNB', 'IN20', 'LI21', 'LI24', 'BSYH', 'LTUH', 'UNDH', 'LTUS', 'UNDS', 'DMPH', 'DMPS']
+DEVICE_TYPES = ['BPMS', 'BLM', 'PROF', 'VVPG', 'TORO', 'KLYS', 'QUAD', 'BEND']
+FAULT_NAMES = ['X_ORBIT', 'Y_ORBIT', 'TMIT', 'LOSS', 'IN_OUT', 'CLOSED', 'CHARGE', 'FAULT']
+STATES = ['IS_OK', 'IS_FAULTED', 'OUT', 'IN', 'MOVING', 'BROKEN']
+DESTINATIONS = ['Laser', 'Gun Spectrometer', 'Diag0', 'BSY', 'HXR', 'SXR', 'Linac']
+RATES = ['0 Hz', '1 Hz', '10 Hz', '30 Hz', '60 Hz', '120 Hz', 'Single Shot']
+RATE_LIMITING_DEVICES = ['Mech Shutter', 'Laser Heater', 'Gun Linac', 'Gun HXR', 'Gun SXR', 'BYKIK HXR', 'BYKIK SXR']
+
+
+def make_names(rng, count):
+    """Make up device and fault name pairs, like MPS faults are named"""
+    names = set()
+    while len(names) < count:
+        device = f'{rng.choice(DEVICE_TYPES)}:{rng.choice(AREAS)}:{rng.randrange(100, 1000)}'
+        names.add((device, rng.choice(FAULT_NAMES)))
+    return sorted(names)
+
+
+def generate_history(filename, start, end, messages_per_hour=MESSAGES_PER_HOUR, fault_count=2000, seed=0):
+    """
+    Write made up history messages between start and end, in seconds since 1990, into a SQLite file
+    Returns the amount of messages of each type that were written
+    """
+    rng = random.Random(seed)
+    engine = create_engine(f'sqlite:///{filename}')
+    create_history_tables(engine)
+    faults = make_names(rng, fault_count)
+
+    total = int(messages_per_hour * (end - start) / 3600)
+    types = rng.choices(list(MESSAGE_MIX), weights=list(MESSAGE_MIX.values()), k=total)
+    times = sorted((rng.randrange(start, end), rng.randrange(1000000000)) for _ in range(total))
+
+    rows = {message_type: [] for message_type in MESSAGE_MIX}
+    for message_type, (seconds, nanos) in zip(types, times):
+        if message_type == 'BD':
+            previous, current = rng.sample(range(1, len(DESTINATIONS) + 1), 2)
+            rows['BD'].append({'sec': seconds, 'nsec': nanos, 'prev': previous, 'curr': current})
+        elif message_type == 'BR':
+            previous, current = rng.sample(range(1, len(RATES) + 1), 2)
+            rows['BR'].append({'sec': seconds, 'nsec': nanos, 'prev': previous, 'curr': current,
+                               'device': rng.randrange(1, len(RATE_LIMITING_DEVICES) + 1)})
+        else:
+            device, fault = rng.choice(faults)
+            row = {'sec': seconds, 'nsec': nanos, 'device': device, 'fault': fault}
+            if message_type == 'BT':
+                row['time'] = rng.choice([0, 3600, 7200, 86400])
+            else:
+                row['prev'], row['curr'] = rng.sample(STATES, 2)
+            rows[message_type].append(row)
+
+    with engine.begin() as con:
+        for table, names in (('destination', DESTINATIONS), ('rate', RATES),
+                             ('rate_limiting_device', RATE_LIMITING_DEVICES)):
+            column = 'device_name' if table == 'rate_limiting_device' else f'{table}_name'
+            con.execute(text(f'INSERT OR IGNORE INTO {table} (id, {column}) VALUES (:id, :name)'),
+                        [{'id': number, 'name': name} for number, name in enumerate(names, start=1)])
+        statements = {
+            'BD': 'INSERT INTO beam_destination (timestamp_sec_past_epoch, timestamp_nsec, \
+                prev_dest_destination_fk, curr_dest_destination_fk) VALUES (:sec, :nsec, :prev, :curr)',
+            'BR': 'INSERT INTO beam_rate_after_device (timestamp_sec_past_epoch, timestamp_nsec, \
+                mitigation_device_rld_fk, prev_rate_rate_fk, curr_rate_rate_fk) \
+                VALUES (:sec, :nsec, :device, :prev, :curr)',
+            'BT': 'INSERT INTO bypass_time (timestamp_sec_past_epoch, timestamp_nsec, \
+                device_name, fault_name, bypass_time_in_seconds) VALUES (:sec, :nsec, :device, :fault, :time)',
+            'BV': 'INSERT INTO bypass_value (timestamp_sec_past_epoch, timestamp_nsec, \
+                device_name, fault_name, prev_value, curr_value) VALUES (:sec, :nsec, :device, :fault, :prev, :curr)',
+            'F': 'INSERT INTO fault (timestamp_sec_past_epoch, timestamp_nsec, \
+                device_name, fault_name, prev_state, curr_state) VALUES (:sec, :nsec, :device, :fault, :prev, :curr)'}
+        for message_type, statement in statements.items():
+            if rows[message_type]:
+                con.execute(text(statement), rows[message_type])
+    engine.dispose()
+
+    return {message_type: len(type_rows) for message_type, type_rows in rows.items()}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Generate History DB")
+    parser.add_argument("filename")
+    parser.add_argument("--hours", type=float, default=24, help="hours of history up to now")
+    parser.add_argument("--rate", type=int, default=MESSAGES_PER_HOUR, help="messages per hour")
+    parser.add_argument("--faults", type=int, default=2000, help="amount of distinct faults")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    end = int(time.time() - FROM_1970_TO_1990_IN_SECONDS)
+    counts = generate_history(args.filename, end - int(args.hours * 3600), end,
+                              messages_per_hour=args.rate, fault_count=args.faults, seed=args.seed)
+    print(f'Wrote {sum(counts.values())} messages to {args.filename}: {counts}')
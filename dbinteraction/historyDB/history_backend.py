@@ -0,0 +1,183 @@
+from abc import ABC, abstractmethod
+from sqlalchemy import create_engine, text
+from dbinteraction.historyDB.history_queries import (BEAM_DESTINATIONS_QUERY, BEAM_RATES_QUERY,
+                                                     BYPASS_TIMES_QUERY, BYPASS_VALUES_QUERY,
+                                                     FAULTS_QUERY, get_overview_query,
+                                                     get_interval_params, get_overview_params)
+
+
+class HistoryBackend(ABC):
+    """
+    author: Evren Keskin
+    ===================================================================
+    Where AllMessagesModel reads the MPS history messages from.
+    Each method returns the rows of one message type between a start and an end time,
+    in seconds and nanoseconds since 1990, newest first.
+    The methods can be called from several threads at once.
+    A backend that misses one of them cannot be made at all.
+    ===================================================================
+    """
+    @abstractmethod
+    def get_beam_destinations(self, startSeconds, startNanos, endSeconds, endNanos):
+        """Rows of (seconds, nanos, previous destination, current destination)"""
+
+    @abstractmethod
+    def get_beam_rates(self, startSeconds, startNanos, endSeconds, endNanos):
+        """Rows of (seconds, nanos, device name, previous rate, current rate)"""
+
+    @abstractmethod
+    def get_bypass_times(self, startSeconds, startNanos, endSeconds, endNanos):
+        """Rows of (seconds, nanos, device name, fault name, bypass time in seconds)"""
+
+    @abstractmethod
+    def get_bypass_values(self, startSeconds, startNanos, endSeconds, endNanos):
+        """Rows of (seconds, nanos, device name, fault name, previous value, current value)"""
+
+    @abstractmethod
+    def get_faults(self, startSeconds, startNanos, endSeconds, endNanos):
+        """Rows of (seconds, nanos, device name, fault name, previous state, current state)"""
+
+    @abstractmethod
+    def get_overview(self, startSeconds, endSeconds, bucketSeconds, messageTypes):
+        """
+        Rows of (bucket, message type, device name, message count), newest bucket first
+        Counted by the database, so only one row per bucket, message type and device is sent back
+        Only the tables of messageTypes are counted
+        Bucket n holds the messages from startSeconds + n * bucketSeconds, up to the next bucket
+        """
+
+
+class OracleHistoryBackend(HistoryBackend):
+    """
+    The production history database on Oracle, logged in to with an Oracle wallet
+    cx_Oracle is only imported once this backend is made, so the other backends run without it
+    """
+    def __init__(self, wallet):
+        from dbinteraction.historyDB import oracle_utilities
+        self.oracle_utilities = oracle_utilities
+        self.wallet = wallet
+
+    def get_beam_destinations(self, startSeconds, startNanos, endSeconds, endNanos):
+        return self.oracle_utilities.get_beam_destinations(startSeconds, startNanos,
+                                                           endSeconds, endNanos, self.wallet)
+
+    def get_beam_rates(self, startSeconds, startNanos, endSeconds, endNanos):
+        return self.oracle_utilities.get_beam_rates(startSeconds, startNanos,
+                                                    endSeconds, endNanos, self.wallet)
+
+    def get_bypass_times(self, startSeconds, startNanos, endSeconds, endNanos):
+        return self.oracle_utilities.get_bypass_times(startSeconds, startNanos,
+                                                      endSeconds, endNanos, self.wallet)
+
+    def get_bypass_values(self, startSeconds, startNanos, endSeconds, endNanos):
+        return self.oracle_utilities.get_bypass_values(startSeconds, startNanos,
+                                                       endSeconds, endNanos, self.wallet)
+
+    def get_faults(self, startSeconds, startNanos, endSeconds, endNanos):
+        return self.oracle_utilities.get_faults(startSeconds, startNanos,
+                                                endSeconds, endNanos, self.wallet)
+
+    def get_overview(self, startSeconds, endSeconds, bucketSeconds, messageTypes):
+        return self.oracle_utilities.get_overview(startSeconds, endSeconds, bucketSeconds, messageTypes,
+                                                  self.wallet)
+
+
+HISTORY_TABLES = (
+    'CREATE TABLE IF NOT EXISTS destination ( \
+        id INTEGER PRIMARY KEY, \
+        destination_name TEXT)',
+    'CREATE TABLE IF NOT EXISTS rate ( \
+        id INTEGER PRIMARY KEY, \
+        rate_name TEXT)',
+    'CREATE TABLE IF NOT EXISTS rate_limiting_device ( \
+        id INTEGER PRIMARY KEY, \
+        device_name TEXT)',
+    'CREATE TABLE IF NOT EXISTS beam_destination ( \
+        id INTEGER PRIMARY KEY, \
+        timestamp_sec_past_epoch INTEGER NOT NULL, \
+        timestamp_nsec INTEGER NOT NULL, \
+        prev_dest_destination_fk INTEGER REFERENCES destination (id), \
+        curr_dest_destination_fk INTEGER REFERENCES destination (id))',
+    'CREATE TABLE IF NOT EXISTS beam_rate_after_device ( \
+        id INTEGER PRIMARY KEY, \
+        timestamp_sec_past_epoch INTEGER NOT NULL, \
+        timestamp_nsec INTEGER NOT NULL, \
+        mitigation_device_rld_fk INTEGER REFERENCES rate_limiting_device (id), \
+        prev_rate_rate_fk INTEGER REFERENCES rate (id), \
+        curr_rate_rate_fk INTEGER REFERENCES rate (id))',
+    'CREATE TABLE IF NOT EXISTS bypass_time ( \
+        id INTEGER PRIMARY KEY, \
+        timestamp_sec_past_epoch INTEGER NOT NULL, \
+        timestamp_nsec INTEGER NOT NULL, \
+        device_name TEXT, \
+        fault_name TEXT, \
+        bypass_time_in_seconds INTEGER)',
+    'CREATE TABLE IF NOT EXISTS bypass_value ( \
+        id INTEGER PRIMARY KEY, \
+        timestamp_sec_past_epoch INTEGER NOT NULL, \
+        timestamp_nsec INTEGER NOT NULL, \
+        device_name TEXT, \
+        fault_name TEXT, \
+        prev_value TEXT, \
+        curr_value TEXT)',
+    'CREATE TABLE IF NOT EXISTS fault ( \
+        id INTEGER PRIMARY KEY, \
+        timestamp_sec_past_epoch INTEGER NOT NULL, \
+        timestamp_nsec INTEGER NOT NULL, \
+        device_name TEXT, \
+        fault_name TEXT, \
+        prev_state TEXT, \
+        curr_state TEXT)')
+"""The tables of the history database that the history queries read, as SQLite tables"""
+
+HISTORY_TIME_TABLES = ('beam_destination', 'beam_rate_after_device', 'bypass_time', 'bypass_value', 'fault')
+"""The history tables that hold the messages, each one is indexed by its timestamp"""
+
+
+def create_history_tables(engine):
+    """Create the history tables and their timestamp indexes in a SQLite database, if they are not there yet"""
+    with engine.begin() as con:
+        for table in HISTORY_TABLES:
+            con.execute(text(table))
+        for table in HISTORY_TIME_TABLES:
+            con.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table}_timestamp \
+                ON {table} (timestamp_sec_past_epoch, timestamp_nsec)'))
+
+
+class SQLiteHistoryBackend(HistoryBackend):
+    """
+    A local stand in for the history database, with the same tables in a SQLite file
+    It runs the same statements as the Oracle backend, so it is used to measure history performance
+    and to run the GUI without the production database
+    """
+    def __init__(self, filename):
+        self.engine = create_engine(f'sqlite:///{filename}?check_same_thread=False')
+        create_history_tables(self.engine)
+
+    def run_query(self, query, params):
+        with self.engine.connect() as con:
+            return [tuple(row) for row in con.execute(text(query), params)]
+
+    def get_beam_destinations(self, startSeconds, startNanos, endSeconds, endNanos):
+        params = get_interval_params(startSeconds, startNanos, endSeconds, endNanos)
+        return self.run_query(BEAM_DESTINATIONS_QUERY, params)
+
+    def get_beam_rates(self, startSeconds, startNanos, endSeconds, endNanos):
+        params = get_interval_params(startSeconds, startNanos, endSeconds, endNanos)
+        return self.run_query(BEAM_RATES_QUERY, params)
+
+    def get_bypass_times(self, startSeconds, startNanos, endSeconds, endNanos):
+        params = get_interval_params(startSeconds, startNanos, endSeconds, endNanos)
+        return self.run_query(BYPASS_TIMES_QUERY, params)
+
+    def get_bypass_values(self, startSeconds, startNanos, endSeconds, endNanos):
+        params = get_interval_params(startSeconds, startNanos, endSeconds, endNanos)
+        return self.run_query(BYPASS_VALUES_QUERY, params)
+
+    def get_faults(self, startSeconds, startNanos, endSeconds, endNanos):
+        params = get_interval_params(startSeconds, startNanos, endSeconds, endNanos)
+        return self.run_query(FAULTS_QUERY, params)
+
+    def get_overview(self, startSeconds, endSeconds, bucketSeconds, messageTypes):
+        params = get_overview_params(startSeconds, endSeconds, bucketSeconds)
+        return self.run_query(get_overview_query(messageTypes), params)
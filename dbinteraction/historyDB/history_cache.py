@@ -0,0 +1,225 @@
+import threading
+import time
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import StaticPool
+from models.prepped_message import format_message
+from mps_constants import FROM_1970_TO_1990_IN_SECONDS, HISTORY_CACHE_SETTLE_SECONDS
+
+MESSAGE_COLUMNS = {'BD': ('prev_value', 'curr_value'),
+                   'BR': ('device_name', 'prev_value', 'curr_value'),
+                   'BT': ('device_name', 'fault_name', 'curr_value'),
+                   'BV': ('device_name', 'fault_name', 'prev_value', 'curr_value'),
+                   'F': ('device_name', 'fault_name', 'prev_value', 'curr_value')}
+"""The cache columns that hold the fields after (seconds, nanos) of each message type's history rows"""
+
+SEARCH_COLUMNS = ('message_text',)
+"""The cache columns a message search looks in, the whole text of the message as it is displayed"""
+FTS_MIN_SEARCH_LENGTH = 3
+"""Shortest search the trigram full text index can answer, shorter ones scan the rows instead"""
+
+
+class HistoryCache:
+    """
+    author: Evren Keskin
+    ===================================================================
+    A local SQLite cache of the rows read from the history database.
+    Rows of all five message types share one table indexed by type and (seconds, nanos),
+    and a coverage table records which whole second ranges [start, end)
+    of each message type are fully in the cache.
+    A time range only needs the history database for the gaps in its coverage.
+    ===================================================================
+    The newest HISTORY_CACHE_SETTLE_SECONDS can still get new rows,
+    so they are cached but never counted as covered.
+    By default the cache only lives in memory, for as long as the GUI is open,
+    and evict_before drops the rows that got too old along with their coverage.
+
+    Every row also keeps its formatted message text, so a search matches what the table shows,
+    like "BPMS:LI21:201 X_ORBIT" or "changed from", not just one field at a time.
+    Searches use an FTS5 trigram index of that text,
+    which finds any substring of three or more characters without scanning the rows.
+    SQLite builds without FTS5 or the trigram tokenizer fall back to scanning.
+    """
+    def __init__(self, filename=':memory:', settle_seconds=HISTORY_CACHE_SETTLE_SECONDS):
+        self.settle_seconds = settle_seconds
+        if filename == ':memory:':
+            # Every thread has to share the one connection, a new one would be a new empty database
+            self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                        connect_args={'check_same_thread': False})
+        else:
+            self.engine = create_engine(f'sqlite:///{filename}?check_same_thread=False')
+        self.lock = threading.Lock()
+        self.has_fts = False
+        self.create_tables()
+        self.create_search_index()
+
+    def create_tables(self):
+        with self.lock, self.engine.begin() as con:
+            con.execute(text(
+                'CREATE TABLE IF NOT EXISTS history_message ( \
+                    seconds INTEGER NOT NULL, \
+                    nanos INTEGER NOT NULL, \
+                    message_type TEXT NOT NULL, \
+                    device_name TEXT, \
+                    fault_name TEXT, \
+                    prev_value, \
+                    curr_value, \
+                    message_text TEXT)'))
+            # Overlapping fetches return some of the same rows again, this lets INSERT OR IGNORE drop them
+            # It also starts with (message_type, seconds, nanos), so it is the time index of each message type
+            con.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_history_message_unique ON history_message ( \
+                    message_type, seconds, nanos, ifnull(device_name, ''), ifnull(fault_name, ''), \
+                    ifnull(prev_value, ''), ifnull(curr_value, ''))"))
+            con.execute(text(
+                'CREATE TABLE IF NOT EXISTS history_coverage ( \
+                    message_type TEXT NOT NULL, \
+                    start_seconds INTEGER NOT NULL, \
+                    end_seconds INTEGER NOT NULL)'))
+
+    def create_search_index(self):
+        """
+        Create the full text index of the searchable columns, kept up to date by triggers on every insert and delete.
+        Leaves has_fts False if this SQLite can not make it.
+        """
+        columns = ', '.join(SEARCH_COLUMNS)
+        try:
+            with self.lock, self.engine.begin() as con:
+                con.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS history_message_fts USING fts5( \
+                        {columns}, content='history_message', tokenize='trigram')"))
+                con.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS history_message_fts_insert AFTER INSERT ON history_message \
+                    BEGIN \
+                        INSERT INTO history_message_fts (rowid, {columns}) \
+                        VALUES (new.rowid, {', '.join('new.' + column for column in SEARCH_COLUMNS)}); \
+                    END"))
+                # An external content index can only forget a row that is given the values it indexed
+                con.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS history_message_fts_delete AFTER DELETE ON history_message \
+                    BEGIN \
+                        INSERT INTO history_message_fts (history_message_fts, rowid, {columns}) \
+                        VALUES ('delete', old.rowid, {', '.join('old.' + column for column in SEARCH_COLUMNS)}); \
+                    END"))
+        except exc.OperationalError:
+            return  # no fts5 module, or no trigram tokenizer before SQLite 3.34
+        self.has_fts = True
+
+    def search_condition(self, search_text):
+        """
+        Build the WHERE condition and its parameters for a case insensitive substring search
+        of the message text
+        """
+        if self.has_fts and len(search_text) >= FTS_MIN_SEARCH_LENGTH:
+            # A quoted phrase is matched as a plain substring by the trigram tokenizer
+            phrase = '"' + search_text.replace('"', '""') + '"'
+            return ('rowid IN (SELECT rowid FROM history_message_fts WHERE history_message_fts MATCH :phrase)',
+                    {'phrase': phrase})
+
+        pattern = '%' + search_text.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        condition = ' OR '.join(f"lower({column}) LIKE :pattern ESCAPE '\\'" for column in SEARCH_COLUMNS)
+        return f'({condition})', {'pattern': pattern}
+
+    def settled_before(self):
+        """The history time, in seconds since 1990, before which no more rows are expected"""
+        return int(time.time() - FROM_1970_TO_1990_IN_SECONDS) - self.settle_seconds
+
+    def get_gaps(self, message_type, start, end):
+        """
+        Get the second ranges [gap_start, gap_end) between start and end
+        that are not covered yet for a message type, oldest first
+        """
+        with self.lock, self.engine.connect() as con:
+            covered = con.execute(text(
+                'SELECT start_seconds, end_seconds FROM history_coverage \
+                WHERE message_type = :message_type AND start_seconds < :end AND end_seconds > :start \
+                ORDER BY start_seconds'),
+                {'message_type': message_type, 'start': start, 'end': end}).all()
+
+        gaps = []
+        gap_start = start
+        for covered_start, covered_end in covered:
+            if covered_start > gap_start:
+                gaps.append((gap_start, covered_start))
+            gap_start = max(gap_start, covered_end)
+        if gap_start < end:
+            gaps.append((gap_start, end))
+        return gaps
+
+    def add_coverage(self, message_type, start, end):
+        """
+        Record that every row of a message type in [start, end) is in the cache.
+        The end is cut back to the settled time, and touching ranges are merged into one.
+        """
+        end = min(end, self.settled_before())
+        if end <= start:
+            return
+
+        params = {'message_type': message_type, 'start': start, 'end': end}
+        with self.lock, self.engine.begin() as con:
+            touching = con.execute(text(
+                'SELECT MIN(start_seconds), MAX(end_seconds) FROM history_coverage \
+                WHERE message_type = :message_type AND start_seconds <= :end AND end_seconds >= :start'),
+                params).one()
+            if touching[0] is not None:
+                params['start'] = min(start, touching[0])
+                params['end'] = max(end, touching[1])
+            con.execute(text(
+                'DELETE FROM history_coverage \
+                WHERE message_type = :message_type AND start_seconds <= :end AND end_seconds >= :start'),
+                params)
+            con.execute(text(
+                'INSERT INTO history_coverage (message_type, start_seconds, end_seconds) \
+                VALUES (:message_type, :start, :end)'), params)
+
+    def insert_rows(self, message_type, rows):
+        """Cache history rows of a message type, in the same shape as the history database returns them"""
+        if not rows:
+            return
+        columns = MESSAGE_COLUMNS[message_type]
+        statement = text(
+            f'INSERT OR IGNORE INTO history_message \
+                (seconds, nanos, message_type, {", ".join(columns)}, message_text) \
+            VALUES (:seconds, :nanos, :message_type, {", ".join(":" + column for column in columns)}, \
+                :message_text)')
+        params = [dict(zip(columns, row[2:]), seconds=row[0], nanos=row[1], message_type=message_type,
+                       message_text=format_message(message_type, row[2:]))
+                  for row in rows]
+        with self.lock, self.engine.begin() as con:
+            con.execute(statement, params)
+
+    def evict_before(self, seconds):
+        """
+        Drop every cached row older than seconds, with its full text index entry,
+        and cut the coverage back so those seconds are read from the history database again
+        """
+        params = {'seconds': seconds}
+        with self.lock, self.engine.begin() as con:
+            # One delete per message type, so each one is a range of the (message_type, seconds) index
+            for message_type in MESSAGE_COLUMNS:
+                con.execute(text(
+                    'DELETE FROM history_message WHERE message_type = :message_type AND seconds < :seconds'),
+                    dict(params, message_type=message_type))
+            con.execute(text('DELETE FROM history_coverage WHERE end_seconds <= :seconds'), params)
+            con.execute(text(
+                'UPDATE history_coverage SET start_seconds = :seconds WHERE start_seconds < :seconds'), params)
+
+    def select_rows(self, message_type, start, end, search_text=''):
+        """
+        Select the cached rows of a message type from start up to end, newest first,
+        in the same shape and with the same bounds as the history database queries
+        search_text only keeps the rows with it in their message text
+        """
+        columns = MESSAGE_COLUMNS[message_type]
+        params = {'message_type': message_type, 'start': start, 'end': end}
+        condition = ''
+        if search_text:
+            search, search_params = self.search_condition(search_text)
+            condition = f'AND {search}'
+            params.update(search_params)
+        with self.lock, self.engine.connect() as con:
+            rows = con.execute(text(
+                f'SELECT seconds, nanos, {", ".join(columns)} FROM history_message \
+                WHERE message_type = :message_type AND seconds >= :start \
+                AND (seconds < :end OR (seconds = :end AND nanos <= 0)) {condition} \
+                ORDER BY seconds DESC, nanos DESC'), params).all()
+        return [tuple(row) for row in rows]
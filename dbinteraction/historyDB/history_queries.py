@@ -0,0 +1,160 @@
+"""The SQL statements of the history database.
+
+They only use SQL that Oracle and SQLite both understand,
+so every history backend runs the very same queries.
+"""
+
+LIKE_TOKEN = '%_%'
+"""Matches any name with at least one character, which leaves out empty names"""
+
+# The history queries are fixed statements with bind variables,
+# so each one is parsed once per Oracle session and then found in the statement cache
+
+BEAM_DESTINATIONS_QUERY = 'SELECT \
+    bdest.timestamp_sec_past_epoch sec, \
+    bdest.timestamp_nsec     nsec, \
+    pdest.destination_name     prev_name, \
+    cdest.destination_name     curr_name \
+    FROM \
+    beam_destination bdest LEFT OUTER JOIN \
+    destination pdest ON bdest.prev_dest_destination_fk = pdest.id LEFT OUTER JOIN \
+    destination cdest ON bdest.curr_dest_destination_fk = cdest.id \
+    WHERE \
+        (bdest.timestamp_sec_past_epoch > :start_sec OR \
+        (bdest.timestamp_sec_past_epoch = :start_sec AND bdest.timestamp_nsec >= :start_nsec)) \
+        AND \
+        (bdest.timestamp_sec_past_epoch < :end_sec OR \
+        (bdest.timestamp_sec_past_epoch = :end_sec AND bdest.timestamp_nsec <= :end_nsec)) \
+        AND \
+        pdest.destination_name LIKE :liketoken \
+        AND \
+            cdest.destination_name LIKE :liketoken \
+    ORDER BY timestamp_sec_past_epoch DESC, timestamp_nsec DESC'
+
+BEAM_RATES_QUERY = 'SELECT \
+    brate.timestamp_sec_past_epoch sec, \
+    brate.timestamp_nsec nsec, \
+    device.device_name dev_name, \
+    prate.rate_name prev_rate, \
+    crate.rate_name curr_rate\
+    FROM \
+    beam_rate_after_device brate LEFT OUTER JOIN \
+    rate_limiting_device device ON brate.mitigation_device_rld_fk = device.id LEFT OUTER JOIN \
+    rate prate ON brate.prev_rate_rate_fk = prate.id LEFT OUTER JOIN \
+    rate crate ON brate.curr_rate_rate_fk = crate.id \
+    WHERE \
+    ( \
+        (brate.timestamp_sec_past_epoch > :start_sec) OR \
+        ( \
+            (brate.timestamp_sec_past_epoch = :start_sec) AND \
+            (brate.timestamp_nsec >= :start_nsec) \
+        ) \
+    ) \
+    AND \
+    ( \
+        (brate.timestamp_sec_past_epoch < :end_sec) OR \
+        ( \
+            (brate.timestamp_sec_past_epoch = :end_sec) AND \
+            (brate.timestamp_nsec <= :end_nsec) \
+        ) \
+    ) \
+    AND \
+    prate.rate_name LIKE :liketoken \
+    ORDER BY timestamp_sec_past_epoch DESC, timestamp_nsec DESC'
+
+BYPASS_TIMES_QUERY = 'SELECT timestamp_sec_past_epoch, timestamp_nsec, \
+    device_name,  fault_name, bypass_time_in_seconds \
+    FROM bypass_time \
+    WHERE (timestamp_sec_past_epoch > :start_sec OR \
+    (timestamp_sec_past_epoch = :start_sec AND timestamp_nsec >= :start_nsec)) \
+    AND \
+    (timestamp_sec_past_epoch < :end_sec OR \
+    (timestamp_sec_past_epoch = :end_sec AND timestamp_nsec <= :end_nsec)) \
+    AND \
+    (device_name LIKE :liketoken OR \
+    fault_name LIKE :liketoken) \
+    ORDER BY timestamp_sec_past_epoch DESC, timestamp_nsec DESC'
+
+BYPASS_VALUES_QUERY = 'SELECT timestamp_sec_past_epoch, timestamp_nsec, \
+    device_name,  fault_name, prev_value, curr_value \
+    FROM bypass_value \
+    WHERE (timestamp_sec_past_epoch > :start_sec OR \
+    (timestamp_sec_past_epoch = :start_sec AND timestamp_nsec >= :start_nsec)) \
+    AND \
+    (timestamp_sec_past_epoch < :end_sec OR \
+    (timestamp_sec_past_epoch = :end_sec AND timestamp_nsec <= :end_nsec)) \
+    AND \
+    (device_name LIKE :liketoken OR \
+    fault_name LIKE :liketoken) \
+    ORDER BY timestamp_sec_past_epoch DESC, timestamp_nsec DESC'
+
+FAULTS_QUERY = 'SELECT timestamp_sec_past_epoch, timestamp_nsec, \
+    device_name,  fault_name, prev_state, curr_state \
+    FROM fault \
+    WHERE (timestamp_sec_past_epoch > :start_sec OR \
+    (timestamp_sec_past_epoch = :start_sec AND timestamp_nsec >= :start_nsec)) \
+    AND \
+    (timestamp_sec_past_epoch < :end_sec OR \
+    (timestamp_sec_past_epoch = :end_sec AND timestamp_nsec <= :end_nsec)) \
+    AND \
+    (device_name LIKE :liketoken OR \
+    fault_name LIKE :liketoken) \
+    ORDER BY timestamp_sec_past_epoch DESC, timestamp_nsec DESC'
+
+
+# The overview counts the messages of each message type and device in every time bucket.
+# Buckets are numbered from :start_sec, and ROUND(x + 0.5) - 1 is the floor of x for x >= 0
+# in both Oracle and SQLite, where FLOOR is not always available and / of integers already floors
+OVERVIEW_BUCKET = 'ROUND((timestamp_sec_past_epoch - :start_sec) / :bucket_sec + 0.5) - 1'
+
+OVERVIEW_BRANCHES = {
+    'BD': f"SELECT {OVERVIEW_BUCKET} bucket, 'BD' message_type, cdest.destination_name device_name \
+        FROM \
+        beam_destination bdest LEFT OUTER JOIN \
+        destination pdest ON bdest.prev_dest_destination_fk = pdest.id LEFT OUTER JOIN \
+        destination cdest ON bdest.curr_dest_destination_fk = cdest.id \
+        WHERE bdest.timestamp_sec_past_epoch >= :start_sec AND bdest.timestamp_sec_past_epoch < :end_sec \
+        AND pdest.destination_name LIKE :liketoken AND cdest.destination_name LIKE :liketoken",
+    'BR': f"SELECT {OVERVIEW_BUCKET} bucket, 'BR' message_type, device.device_name device_name \
+        FROM \
+        beam_rate_after_device brate LEFT OUTER JOIN \
+        rate_limiting_device device ON brate.mitigation_device_rld_fk = device.id LEFT OUTER JOIN \
+        rate prate ON brate.prev_rate_rate_fk = prate.id \
+        WHERE brate.timestamp_sec_past_epoch >= :start_sec AND brate.timestamp_sec_past_epoch < :end_sec \
+        AND prate.rate_name LIKE :liketoken",
+    'BT': f"SELECT {OVERVIEW_BUCKET} bucket, 'BT' message_type, device_name \
+        FROM bypass_time \
+        WHERE timestamp_sec_past_epoch >= :start_sec AND timestamp_sec_past_epoch < :end_sec \
+        AND (device_name LIKE :liketoken OR fault_name LIKE :liketoken)",
+    'BV': f"SELECT {OVERVIEW_BUCKET} bucket, 'BV' message_type, device_name \
+        FROM bypass_value \
+        WHERE timestamp_sec_past_epoch >= :start_sec AND timestamp_sec_past_epoch < :end_sec \
+        AND (device_name LIKE :liketoken OR fault_name LIKE :liketoken)",
+    'F': f"SELECT {OVERVIEW_BUCKET} bucket, 'F' message_type, device_name \
+        FROM fault \
+        WHERE timestamp_sec_past_epoch >= :start_sec AND timestamp_sec_past_epoch < :end_sec \
+        AND (device_name LIKE :liketoken OR fault_name LIKE :liketoken)"}
+
+
+def get_overview_query(message_types):
+    "Returns the overview query of some message types, the same types always give the same statement text"
+    branches = ' UNION ALL '.join(OVERVIEW_BRANCHES[message_type] for message_type in OVERVIEW_BRANCHES
+                                  if message_type in message_types)
+    return f"SELECT bucket, message_type, device_name, COUNT(*) message_count FROM ( \
+    {branches} \
+    ) \
+    GROUP BY bucket, message_type, device_name \
+    ORDER BY bucket DESC, message_type, device_name"
+
+
+def get_interval_params(startSeconds, startNanos, endSeconds, endNanos):
+    "Returns the bind variable values shared by all history queries"
+    return {'start_sec': startSeconds, 'start_nsec': startNanos,
+            'end_sec': endSeconds, 'end_nsec': endNanos,
+            'liketoken': LIKE_TOKEN}
+
+
+def get_overview_params(startSeconds, endSeconds, bucketSeconds):
+    "Returns the bind variable values of the overview query"
+    return {'start_sec': startSeconds, 'end_sec': endSeconds,
+            'bucket_sec': bucketSeconds, 'liketoken': LIKE_TOKEN}
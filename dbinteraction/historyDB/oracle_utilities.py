@@ -11,19 +11,39 @@ Modified for History DB use
 """
 
 import os
+import threading
 
 import cx_Oracle
 
+from mps_constants import HISTORY_QUERY_THREADS
+from dbinteraction.historyDB.history_queries import (BEAM_DESTINATIONS_QUERY, BEAM_RATES_QUERY,
+                                                     BYPASS_TIMES_QUERY, BYPASS_VALUES_QUERY,
+                                                     FAULTS_QUERY, get_overview_query,
+                                                     get_interval_params, get_overview_params)
+
+POOL_MIN_SESSIONS = 1
+"""Sessions each pool keeps open even when idle"""
+POOL_MAX_SESSIONS = HISTORY_QUERY_THREADS
+"""Most sessions a pool opens, one for each history query that can run at once"""
+POOL_PING_INTERVAL = 60
+"""Seconds a pooled session can sit idle before it is pinged again when acquired"""
+STATEMENT_CACHE_SIZE = 20
+"""Statements each session keeps parsed, enough for every history query"""
+FETCH_ARRAYSIZE = 1000
+"""Rows fetched from Oracle in each round trip"""
+FETCH_PREFETCH_ROWS = 1000
+"""Rows Oracle sends back along with the reply to the execute itself"""
+
+_pools = {}
+_pools_lock = threading.Lock()
 
-def connect(wallet, user):
-    """Connects to Oracle.
+
+def set_environment(wallet, user):
+    """Sets the Oracle environment variables for a wallet and user.
 
     Args:
         wallet (str): The Oracle wallet, which contains credentials
         user (str): The username of the Oracle database
-
-    Returns:
-        A connection object on which one can execute Oracle queries.
     """
     # If on dev, use afs directories
     wallet_dir = '/usr/local/lcls/tools/oracle/wallets'
@@ -36,167 +56,174 @@ def connect(wallet, user):
 
     os.environ['TNS_ADMIN'] = os.path.join(wallet_dir, wallet)
     os.environ['TWO_TASK'] = user
+
+
+def connect(wallet, user):
+    """Connects to Oracle.
+
+    Args:
+        wallet (str): The Oracle wallet, which contains credentials
+        user (str): The username of the Oracle database
+
+    Returns:
+        A connection object on which one can execute Oracle queries.
+    """
+    set_environment(wallet, user)
     con = cx_Oracle.connect('/@' + user)
     return con
 
 
-def run_query(wallet, user, query):
+def get_pool(wallet, user):
+    """Gets the session pool of a wallet and user, creating it on first use.
+
+    There is one pool per wallet and user in each process, so every query
+    reuses logged in sessions instead of doing a new login each time.
+
+    Args:
+        wallet (str): The Oracle wallet, which contains credentials
+        user (str): The username of the Oracle database
+
+    Returns:
+        A cx_Oracle.SessionPool that sessions can be acquired from.
+    """
+    key = (wallet, user)
+    with _pools_lock:
+        if key not in _pools:
+            set_environment(wallet, user)
+            _pools[key] = cx_Oracle.SessionPool(dsn=user, min=POOL_MIN_SESSIONS, max=POOL_MAX_SESSIONS,
+                                                increment=1, externalauth=True, homogeneous=False,
+                                                threaded=True, getmode=cx_Oracle.SPOOL_ATTRVAL_WAIT,
+                                                ping_interval=POOL_PING_INTERVAL,
+                                                stmtcachesize=STATEMENT_CACHE_SIZE)
+        return _pools[key]
+
+
+def close_pool(wallet, user):
+    """Closes the session pool of a wallet and user, so the next query makes a new one.
+
+    Args:
+        wallet (str): The Oracle wallet, which contains credentials
+        user (str): The username of the Oracle database
+    """
+    with _pools_lock:
+        pool = _pools.pop((wallet, user), None)
+    if pool is None:
+        return
+    try:
+        pool.close(force=True)
+    except cx_Oracle.Error:
+        pass  # the pool is being thrown away because it is broken already
+
+
+def is_alive(con):
+    """Checks if a session still reaches the database.
+
+    Args:
+        con: A connection acquired from a session pool
+
+    Returns:
+        True if the session answers a ping.
+    """
+    try:
+        con.ping()
+        return True
+    except cx_Oracle.Error:
+        return False
+
+
+def run_query(wallet, user, query, params=None, arraysize=FETCH_ARRAYSIZE, prefetchrows=FETCH_PREFETCH_ROWS):
     """Executes a query on Oracle.
 
+    The query runs on a pooled session. If it fails because the session
+    or the whole pool has lost the database, it is retried once on a new one.
+    Queries should use bind variables for their values, so the statement text
+    stays the same between calls and is found in the session's statement cache.
+
     Args:
         wallet (str): The Oracle wallet, which contains credentials
         user (str): The username of the Oracle database
         query (str): The SQL query.
+        params (dict): The values of the query's bind variables
+        arraysize (int): Rows fetched in each round trip
+        prefetchrows (int): Rows returned along with the execute
 
     Returns:
         A list of the rows returned by Oracle. Each row is a tuple.
 
     """
-    con = connect(wallet, user)
-    cur = con.cursor()
-    cur.execute(query)
-    res = cur.fetchall()
-    cur.close()
-    con.close()
-    return res
+    for attempt in range(2):
+        pool = get_pool(wallet, user)
+        try:
+            con = pool.acquire()
+        except cx_Oracle.Error:
+            close_pool(wallet, user)
+            if attempt:
+                raise
+            continue
+
+        # The session goes back to the pool however the query ends, or is dropped if it died
+        broken = False
+        try:
+            cur = con.cursor()
+            cur.arraysize = arraysize
+            cur.prefetchrows = prefetchrows
+            cur.execute(query, params or {})
+            res = cur.fetchall()
+            cur.close()
+            return res
+        except cx_Oracle.DatabaseError:
+            if attempt or is_alive(con):
+                raise
+            # The session died under us, throw it away and try again on a fresh one
+            broken = True
+        finally:
+            if broken:
+                pool.drop(con)
+            else:
+                pool.release(con)
+
+
+HISTORY_USER = 'MCCQA'
+"""The username of the history database"""
 
 
 def get_beam_destinations(startSeconds, startNanos, endSeconds, endNanos, wallet):
     "Returns boolean of possible retrieved messages data for history"
 
-    user = 'MCCQA'
-
-    liketoken = '%_%'
-
-    query = f'SELECT \
-    bdest.timestamp_sec_past_epoch sec, \
-    bdest.timestamp_nsec     nsec, \
-    pdest.destination_name     prev_name, \
-    cdest.destination_name     curr_name \
-    FROM \
-    beam_destination bdest LEFT OUTER JOIN \
-    destination pdest ON bdest.prev_dest_destination_fk = pdest.id LEFT OUTER JOIN \
-    destination cdest ON bdest.curr_dest_destination_fk = cdest.id \
-    WHERE \
-        (bdest.timestamp_sec_past_epoch > {startSeconds} OR \
-        (bdest.timestamp_sec_past_epoch = {startSeconds} AND bdest.timestamp_nsec >= {startNanos})) \
-        AND \
-        (bdest.timestamp_sec_past_epoch < {endSeconds} OR \
-        (bdest.timestamp_sec_past_epoch = {endSeconds} AND bdest.timestamp_nsec <= {endNanos})) \
-        AND \
-        pdest.destination_name LIKE \'{liketoken}\' \
-        AND \
-            cdest.destination_name LIKE \'{liketoken}\' \
-    ORDER BY timestamp_sec_past_epoch DESC, timestamp_nsec DESC'
-
-    return run_query(wallet, user, query)
+    params = get_interval_params(startSeconds, startNanos, endSeconds, endNanos)
+    return run_query(wallet, HISTORY_USER, BEAM_DESTINATIONS_QUERY, params)
 
 
 def get_beam_rates(startSeconds, startNanos, endSeconds, endNanos, wallet):
     "Returns boolean of possible retrieved messages data for history"
 
-    user = 'MCCQA'
-
-    liketoken = '%_%'
-
-    query = f'SELECT \
-    brate.timestamp_sec_past_epoch sec, \
-    brate.timestamp_nsec nsec, \
-    device.device_name dev_name, \
-    prate.rate_name prev_rate, \
-    crate.rate_name curr_rate\
-    FROM \
-    beam_rate_after_device brate LEFT OUTER JOIN \
-    rate_limiting_device device ON brate.mitigation_device_rld_fk = device.id LEFT OUTER JOIN \
-    rate prate ON brate.prev_rate_rate_fk = prate.id LEFT OUTER JOIN \
-    rate crate ON brate.curr_rate_rate_fk = crate.id \
-    WHERE \
-    ( \
-        (brate.timestamp_sec_past_epoch > {startSeconds}) OR \
-        ( \
-            (brate.timestamp_sec_past_epoch = {startSeconds}) AND \
-            (brate.timestamp_nsec >= {startNanos}) \
-        ) \
-    ) \
-    AND \
-    ( \
-        (brate.timestamp_sec_past_epoch < {endSeconds}) OR \
-        ( \
-            (brate.timestamp_sec_past_epoch = {endSeconds}) AND \
-            (brate.timestamp_nsec <= {endNanos}) \
-        ) \
-    ) \
-    AND \
-    prate.rate_name LIKE \'{liketoken}\' \
-    ORDER BY timestamp_sec_past_epoch DESC, timestamp_nsec DESC'
-
-    return run_query(wallet, user, query)
+    params = get_interval_params(startSeconds, startNanos, endSeconds, endNanos)
+    return run_query(wallet, HISTORY_USER, BEAM_RATES_QUERY, params)
 
 
 def get_bypass_times(startSeconds, startNanos, endSeconds, endNanos, wallet):
     "Returns boolean of possible retrieved messages data for history"
 
-    user = 'MCCQA'
-
-    liketoken = '%_%'
-
-    query = f'SELECT timestamp_sec_past_epoch, timestamp_nsec, \
-    device_name,  fault_name, bypass_time_in_seconds \
-    FROM bypass_time \
-    WHERE (timestamp_sec_past_epoch > {startSeconds} OR \
-    (timestamp_sec_past_epoch = {startSeconds} AND timestamp_nsec >= {startNanos})) \
-    AND \
-    (timestamp_sec_past_epoch < {endSeconds} OR \
-    (timestamp_sec_past_epoch = {endSeconds} AND timestamp_nsec <= {endNanos})) \
-    AND \
-    (device_name LIKE \'{liketoken}\' OR \
-    fault_name LIKE \'{liketoken}\') \
-    ORDER BY timestamp_sec_past_epoch DESC, timestamp_nsec DESC'
-
-    return run_query(wallet, user, query)
+    params = get_interval_params(startSeconds, startNanos, endSeconds, endNanos)
+    return run_query(wallet, HISTORY_USER, BYPASS_TIMES_QUERY, params)
 
 
 def get_bypass_values(startSeconds, startNanos, endSeconds, endNanos, wallet):
     "Returns boolean of possible retrieved messages data for history"
 
-    user = 'MCCQA'
-
-    liketoken = '%_%'
-
-    query = f'SELECT timestamp_sec_past_epoch, timestamp_nsec, \
-    device_name,  fault_name, prev_value, curr_value \
-    FROM bypass_value \
-    WHERE (timestamp_sec_past_epoch > {startSeconds} OR \
-    (timestamp_sec_past_epoch = {startSeconds} AND timestamp_nsec >= {startNanos})) \
-    AND \
-    (timestamp_sec_past_epoch < {endSeconds} OR \
-    (timestamp_sec_past_epoch = {endSeconds} AND timestamp_nsec <= {endNanos})) \
-    AND \
-    (device_name LIKE \'{liketoken}\' OR \
-    fault_name LIKE \'{liketoken}\') \
-    ORDER BY timestamp_sec_past_epoch DESC, timestamp_nsec DESC'
-
-    return run_query(wallet, user, query)
+    params = get_interval_params(startSeconds, startNanos, endSeconds, endNanos)
+    return run_query(wallet, HISTORY_USER, BYPASS_VALUES_QUERY, params)
 
 
 def get_faults(startSeconds, startNanos, endSeconds, endNanos, wallet):
     "Returns boolean of possible retrieved messages data for history"
 
-    user = 'MCCQA'
+    params = get_interval_params(startSeconds, startNanos, endSeconds, endNanos)
+    return run_query(wallet, HISTORY_USER, FAULTS_QUERY, params)
 
-    liketoken = '%_%'
 
-    query = f'SELECT timestamp_sec_past_epoch, timestamp_nsec, \
-    device_name,  fault_name, prev_state, curr_state \
-    FROM fault \
-    WHERE (timestamp_sec_past_epoch > {startSeconds} OR \
-    (timestamp_sec_past_epoch = {startSeconds} AND timestamp_nsec >= {startNanos})) \
-    AND \
-    (timestamp_sec_past_epoch < {endSeconds} OR \
-    (timestamp_sec_past_epoch = {endSeconds} AND timestamp_nsec <= {endNanos})) \
-    AND \
-    (device_name LIKE \'{liketoken}\' OR \
-    fault_name LIKE \'{liketoken}\') \
-    ORDER BY timestamp_sec_past_epoch DESC, timestamp_nsec DESC'
+def get_overview(startSeconds, endSeconds, bucketSeconds, messageTypes, wallet):
+    "Returns the message counts of each time bucket, message type and device, counted by Oracle"
 
-    return run_query(wallet, user, query)
+    params = get_overview_params(startSeconds, endSeconds, bucketSeconds)
+    return run_query(wallet, HISTORY_USER, get_overview_query(messageTypes), params)
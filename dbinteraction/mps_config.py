@@ -1,11 +1,34 @@
-from sqlalchemy import create_engine
+from urllib.parse import quote
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import (sessionmaker, scoped_session)
+from mps_constants import SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB
 
 # Smaller replicate of MPSConfig from SC_MPS_GUI
 
 
 class MPSConfig:
-    def __init__(self, filename=None):
-        self.engine = create_engine(f"sqlite:///{filename}?check_same_thread=False")
+    """
+    Opens a SQLite database file with a sqlalchemy engine and session maker.
+    With read_only, the file is opened as an immutable SQLite URI, for the versioned
+    config and logic databases that never change once published. SQLite then takes no locks
+    and never checks the file for changes, which avoids the lock traffic on network filesystems,
+    and the bulk reads go through memory mapped I/O and a larger page cache.
+    The recent states databases are written to, so they are opened normally.
+    """
+    def __init__(self, filename=None, read_only=False):
+        if read_only:
+            self.engine = create_engine(f"sqlite:///file:{quote(filename)}?mode=ro&immutable=1"
+                                        "&check_same_thread=False&uri=true")
+            event.listen(self.engine, 'connect', set_read_pragmas)
+        else:
+            self.engine = create_engine(f"sqlite:///{filename}?check_same_thread=False")
         self.Session = scoped_session(sessionmaker(bind=self.engine))
         # self.session = self.Session()
+
+
+def set_read_pragmas(dbapi_connection, connection_record):
+    """Memory map the database file and give each connection a larger page cache"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}')
+    cursor.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}')
+    cursor.close()
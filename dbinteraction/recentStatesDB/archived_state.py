@@ -0,0 +1,55 @@
+from sqlalchemy import Column, String, Index
+from .models_init import Base
+from sqlalchemy import BigInteger
+from sqlalchemy.dialects import postgresql, mysql, sqlite
+
+
+class Archived_State(Base):
+    """
+    author: Evren Keskin
+    Archived_State class (archived_state table)
+
+    Describe an Archived_State, which is a Recent_State kept in a daily archive file.
+    Every state change the daemon sees is written to the archive file of its day,
+    so it outlives the rolling recent_state table.
+
+    Properties:
+    id: autoincrementing numeric ID for all items in one archive file
+    date: a string representing what date and time this state change happened
+    macro_name: a name for the given macro
+    state_name: a name for the given macro state
+    min_rate: min of all the rates as a string
+    rate_gunl, rate_ms, rate_bykik, rate_lhs,
+    rate_gunh, rate_guns, rate_bykiks: the same rate strings as Recent_State
+
+    Relationships:
+    --- None
+
+    Indexes:
+    date: used to read a time range of one archive file
+    (macro_name, date): used to read a time range of one macro
+    """
+    __tablename__ = 'archived_state'
+    __table_args__ = (Index('ix_archived_state_date', 'date'),
+                      Index('ix_archived_state_macro_name_date', 'macro_name', 'date'))
+
+    # SQLAlchemy does not map BigInt to Int by default on the sqlite dialect.
+    # It should, but it doesnt.
+    BigIntegerType = BigInteger()
+    BigIntegerType = BigIntegerType.with_variant(postgresql.BIGINT(), 'postgresql')
+    BigIntegerType = BigIntegerType.with_variant(mysql.BIGINT(), 'mysql')
+    BigIntegerType = BigIntegerType.with_variant(sqlite.INTEGER(), 'sqlite')
+
+    id = Column('id', BigIntegerType, primary_key=True, autoincrement=True)
+    date = Column('date', String)
+    macro_name = Column('macro_name', String)
+    state_name = Column('state_name', String)
+
+    min_rate = Column('min_rate', String)
+    rate_gunl = Column('rate_gunl', String)
+    rate_ms = Column('rate_ms', String)
+    rate_bykik = Column('rate_bykik', String)
+    rate_lhs = Column('rate_lhs', String)
+    rate_gunh = Column('rate_gunh', String)
+    rate_guns = Column('rate_guns', String)
+    rate_bykiks = Column('rate_bykiks', String)
@@ -0,0 +1,115 @@
+import os
+from glob import glob
+from datetime import datetime, timedelta
+from dbinteraction.mps_config import MPSConfig
+from dbinteraction.recentStatesDB.archived_state import Archived_State
+
+ARCHIVE_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+"""The format of the date strings written by the daemon, which also sort in time order"""
+
+
+class RecentStatesArchive:
+    """
+    author: Evren Keskin
+    ===================================================================
+    A time partitioned archive of every state change the daemon sees.
+    Each day gets its own SQLite file in archive_dir, named by its date,
+    so a time range query only opens the files of the days it covers,
+    and old history is dropped by deleting whole files.
+    ===================================================================
+    """
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self.partitions = {}  # open MPSConfig of each day that has been written to, by date
+
+    def get_filename(self, day):
+        """The archive file of a given day"""
+        return os.path.join(self.archive_dir, f'recent_states_{day:%Y-%m-%d}.sqlite')
+
+    def get_partition(self, day):
+        """
+        Get the archive file of a given day for writing, creating it if it is new
+        Files that are written to stay open, the daemon only ever writes to the latest day or two
+        """
+        if day not in self.partitions:
+            partition = MPSConfig(self.get_filename(day))
+            Archived_State.__table__.create(bind=partition.engine, checkfirst=True)
+            self.partitions[day] = partition
+        return self.partitions[day]
+
+    def do_insert(self, date_param, macro_name_param, state_name_param,
+                  min_rate_param='--', rate_gunl_param='--',
+                  rate_ms_param='--', rate_bykik_param='--', rate_lhs_param='--',
+                  rate_gunh_param='--', rate_guns_param='--', rate_bykiks_param='--'):
+        """
+        Write one state change into the archive file of its day
+        Takes the same parameters as recent_sql.do_single_insert
+        """
+        day = datetime.strptime(date_param, ARCHIVE_DATE_FORMAT).date()
+        partition = self.get_partition(day)
+
+        state = Archived_State(date=date_param, macro_name=macro_name_param, state_name=state_name_param,
+                               min_rate=min_rate_param, rate_gunl=rate_gunl_param, rate_ms=rate_ms_param,
+                               rate_bykik=rate_bykik_param, rate_lhs=rate_lhs_param, rate_gunh=rate_gunh_param,
+                               rate_guns=rate_guns_param, rate_bykiks=rate_bykiks_param)
+
+        with partition.Session() as session:
+            session.add(state)
+            session.commit()
+
+    def do_select(self, start: datetime, end: datetime, macro_name=None):
+        """
+        Select every archived state change from start to end, oldest first
+        Only the archive files of the days between start and end are opened
+        """
+        start_str = start.strftime(ARCHIVE_DATE_FORMAT)
+        end_str = end.strftime(ARCHIVE_DATE_FORMAT)
+
+        results = []
+        day = start.date()
+        while day <= end.date():
+            filename = self.get_filename(day)
+            partition = self.partitions.get(day)
+            day += timedelta(days=1)
+            if partition is None:
+                if not os.path.exists(filename):
+                    continue
+                # Days that are only read are opened just for this query
+                partition = MPSConfig(filename)
+                is_temporary = True
+            else:
+                is_temporary = False
+
+            with partition.Session() as session:
+                query = session.query(Archived_State.date, Archived_State.macro_name,
+                                      Archived_State.state_name, Archived_State.min_rate,
+                                      Archived_State.rate_ms, Archived_State.rate_lhs,
+                                      Archived_State.rate_gunl, Archived_State.rate_gunh,
+                                      Archived_State.rate_guns, Archived_State.rate_bykik,
+                                      Archived_State.rate_bykiks).filter(
+                    Archived_State.date >= start_str, Archived_State.date <= end_str)
+                if macro_name is not None:
+                    query = query.filter(Archived_State.macro_name == macro_name)
+                results += [tuple(item) for item in query.order_by(Archived_State.date, Archived_State.id).all()]
+
+            if is_temporary:
+                partition.engine.dispose()
+
+        return results
+
+    def remove_partitions_before(self, day):
+        """
+        Delete the archive files of every day before the given day
+        """
+        for filename in glob(os.path.join(self.archive_dir, 'recent_states_*.sqlite')):
+            date_text = os.path.basename(filename)[len('recent_states_'):-len('.sqlite')]
+            try:
+                file_day = datetime.strptime(date_text, '%Y-%m-%d').date()
+            except ValueError:
+                continue
+            if file_day < day:
+                partition = self.partitions.pop(file_day, None)
+                if partition is not None:
+                    partition.engine.dispose()
+                os.remove(filename)
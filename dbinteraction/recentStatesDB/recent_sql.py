@@ -1,9 +1,9 @@
 from sqlalchemy import create_engine, exc
-from sqlalchemy import Table, Column, String, MetaData
-from sqlalchemy import BigInteger
+from sqlalchemy import Table, Column, String, MetaData, Index
+from sqlalchemy import BigInteger, func, text
 from sqlalchemy.dialects import postgresql, mysql, sqlite
 from dbinteraction.recentStatesDB.recent_state import Recent_State
-from mps_constants import RECENT_FAULTS_MAX
+from mps_constants import RECENT_FAULTS_MAX, RECENT_SEARCH_NAMES_MAX
 
 # https://www.tutorialspoint.com/sqlalchemy/sqlalchemy_core_creating_table.htm
 
@@ -15,43 +15,105 @@ def do_single_insert(session, date_param, macro_name_param, state_name_param,
     # print('inserting 1 item:', date_param)
     # configurator = MPSConfig(recent_sqlite_file)
 
-    numberOfThings = session.query(Recent_State).count()
-    if numberOfThings >= RECENT_FAULTS_MAX:
-        # print('removing 1 oldest item')
-        # DELETE FROM Recent_State WHERE id IN (SELECT id FROM Recent_State ORDER BY id LIMIT 1)
-        first_item = session.query(Recent_State).order_by(Recent_State.id.asc()).first()
-        session.delete(first_item)
-
     rs = Recent_State(date=date_param, macro_name=macro_name_param, state_name=state_name_param,
                       min_rate=min_rate_param, rate_gunl=rate_gunl_param, rate_ms=rate_ms_param,
                       rate_bykik=rate_bykik_param, rate_lhs=rate_lhs_param, rate_gunh=rate_gunh_param,
                       rate_guns=rate_guns_param, rate_bykiks=rate_bykiks_param)
 
     session.add(rs)
+    session.flush()
+
+    # Ids only ever grow, so everything older than the newest RECENT_FAULTS_MAX rows
+    # is one primary key range, no need to count the whole table on every insert
+    # DELETE FROM recent_state WHERE id <= newest_id - RECENT_FAULTS_MAX
+    session.query(Recent_State).filter(Recent_State.id <= rs.id - RECENT_FAULTS_MAX).delete(
+        synchronize_session=False)
+
     session.commit()
     session.close()
 
-    # print('new length:', configurator.session.query(Recent_State.id).count())
 
-
-def do_select(session):
+def do_select_macro_names(session):
+    """
+    Select every distinct macro name in the recent states.
+    This hops through the macro name index one name at a time (a loose index scan),
+    so it costs one index lookup per distinct name instead of a pass over every row.
+    """
+    results = session.execute(text(
+        'WITH RECURSIVE names(name) AS ( \
+            SELECT MIN(macro_name) FROM recent_state \
+            UNION ALL \
+            SELECT (SELECT MIN(macro_name) FROM recent_state WHERE macro_name > name) \
+            FROM names WHERE name IS NOT NULL) \
+        SELECT name FROM names WHERE name IS NOT NULL')).all()
+    return [name for (name,) in results]
+
+
+def search_condition(session, search_text):
+    """
+    Build the WHERE condition for a case insensitive macro name substring search.
+    The matching names are found first so the rows can be read through the macro name index,
+    unless so many names match that scanning the rows by id is just as quick.
+    Build it once and pass it to every query of one load, so the names are only looked up once.
+    """
+    search_text = search_text.lower()
+    matching_names = [name for name in do_select_macro_names(session) if search_text in name.lower()]
+    if len(matching_names) <= RECENT_SEARCH_NAMES_MAX:
+        return Recent_State.macro_name.in_(matching_names)
+    return func.lower(Recent_State.macro_name).contains(search_text, autoescape=True)
+
+
+def do_select_page(session, before_id=None, after_id=None, limit=None, condition=None):
+    """
+    Select one page of recent states, newest first, using the row id as the key.
+    before_id pages back into older rows, after_id gets rows newer than what is already shown.
+    condition, from search_condition, only keeps the recent states whose macro name matches the search.
+    """
 
     # SELECT id, date, macro_name, state_name, min_rate, \
-    # rate_gunl, rate_ms, rate_bykik, rate_lhs, rate_gunh, rate_guns, rate_bykiks \
-    # FROM recent_states \
-    # ORDER BY date ;
-
-    results = session.query(Recent_State.id, Recent_State.date, Recent_State.macro_name,
-                            Recent_State.state_name, Recent_State.min_rate, Recent_State.rate_ms,
-                            Recent_State.rate_lhs, Recent_State.rate_gunl, Recent_State.rate_gunh,
-                            Recent_State.rate_guns, Recent_State.rate_bykik,
-                            Recent_State.rate_bykiks).order_by(
-                                Recent_State.date).all()
-    notsqliterelatedresults = []  # convert results to a regular list in python
-    for item in results:
-        notsqliterelatedresults.append(item)
-
-    return notsqliterelatedresults
+    # rate_ms, rate_lhs, rate_gunl, rate_gunh, rate_guns, rate_bykik, rate_bykiks \
+    # FROM recent_state \
+    # WHERE id < :before_id AND id > :after_id AND macro_name IN (:matching_names) \
+    # ORDER BY id DESC LIMIT :limit ;
+
+    query = session.query(Recent_State.id, Recent_State.date, Recent_State.macro_name,
+                          Recent_State.state_name, Recent_State.min_rate, Recent_State.rate_ms,
+                          Recent_State.rate_lhs, Recent_State.rate_gunl, Recent_State.rate_gunh,
+                          Recent_State.rate_guns, Recent_State.rate_bykik,
+                          Recent_State.rate_bykiks)
+    if before_id is not None:
+        query = query.filter(Recent_State.id < before_id)
+    if after_id is not None:
+        query = query.filter(Recent_State.id > after_id)
+    if condition is not None:
+        query = query.filter(condition)
+    query = query.order_by(Recent_State.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+
+    return [tuple(item) for item in query.all()]  # convert results to a regular list in python
+
+
+def do_select_count(session, condition=None):
+    """
+    Count the retained recent states, or the ones matching a condition from search_condition.
+    Rows are only ever removed from the oldest end, so the id range is the row count.
+    """
+    if condition is not None:
+        return session.query(func.count(Recent_State.id)).filter(condition).scalar()
+
+    low, high = session.query(func.min(Recent_State.id), func.max(Recent_State.id)).one()
+    if low is None:
+        return 0
+    return high - low + 1
+
+
+def create_indexes_if_not_exist(engine):
+    """
+    Add the indexes of the recent_state table to a DB made before they existed.
+    """
+    for index in Recent_State.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
 
 
 def create_db_if_not_exists(recent_sqlite_file):
@@ -96,5 +158,6 @@ def create_table_in_db(meta):
         Column('rate_guns', String),
         Column('rate_bykiks', String),
     )
+    Index('ix_recent_state_macro_name_id', recent_state.c.macro_name, recent_state.c.id)
 
     return recent_state
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, Index
 from .models_init import Base
 from sqlalchemy import BigInteger
 from sqlalchemy.dialects import postgresql, mysql, sqlite
@@ -32,8 +32,12 @@ class Recent_State(Base):
     Relationships:
     --- None
 
+    Indexes:
+    (macro_name, id): used by the recent faults search to read one macro's states newest first
+
     """
     __tablename__ = 'recent_state'
+    __table_args__ = (Index('ix_recent_state_macro_name_id', 'macro_name', 'id'),)
 
     # SQLAlchemy does not map BigInt to Int by default on the sqlite dialect.
     # It should, but it doesnt.
@@ -0,0 +1,143 @@
+import hashlib
+from os import path
+from sqlalchemy import text
+from dbinteraction.mps_config import MPSConfig
+
+FAULT_QUERIES = {'epics_fault': 'SELECT * FROM epics_fault',
+                 'link_node_fault': 'SELECT link_node_fault.*, ZLINKNODE.ZHOSTNAME FROM link_node_fault \
+                                     LEFT JOIN ZLINKNODE ON link_node_fault.link_node_id = ZLINKNODE.ZLINKNODEID',
+                 'link_node_channel_fault': 'SELECT * FROM link_node_channel_fault',
+                 'link_processor_fault': 'SELECT * FROM link_processor_fault'}
+"""The query of each config database table of faults, every row is one fault"""
+
+
+def content_hash(*content):
+    """A short hash of the repr of some row content"""
+    return hashlib.blake2b(repr(content).encode(), digest_size=16).digest()
+
+
+def row_content(row, skipped_columns):
+    """The (column, value) pairs of a row, sorted, without the columns that differ between versions anyway"""
+    return tuple(sorted((column, value) for column, value in row.items() if column not in skipped_columns))
+
+
+def read_digest(config_filename, logic_filename):
+    """
+    The digest of a config and logic version's database files, or None if one of them is missing.
+    The models open the default database instead of a missing file, so a missing one can not be diffed
+    until its models are built, then model_digest reads the files they actually opened.
+    """
+    if not (path.exists(config_filename) and path.exists(logic_filename)):
+        return None
+    return VersionDigest(config_filename, logic_filename)
+
+
+def model_digest(logic_model):
+    """The digest of the database files a logic model and its faults model were loaded from"""
+    return VersionDigest(logic_model.configDB.filename, logic_model.filename)
+
+
+class VersionDigest:
+    """
+    author: Evren Keskin
+    ===================================================================
+    The content hashes of every macro, macro state and fault of one config and logic version.
+    Rows are keyed by what stays the same between versions, the macro numbers,
+    state numbers and fault numbers, never by the primary keys of the database files.
+    A macro's hash covers its own row, its devices and its ignore conditions,
+    each state and fault is hashed on its own.
+    Two digests are compared with diff, which is much cheaper than building the models.
+    ===================================================================
+    """
+    def __init__(self, config_filename, logic_filename):
+        self.macros = {}  # macro number: hash
+        self.states = {}  # (macro number, state number): hash
+        self.faults = {}  # fault number: hash
+
+        self.read_logic(MPSConfig(logic_filename, read_only=True))
+        self.read_faults(MPSConfig(config_filename, read_only=True))
+
+    def read_logic(self, config: MPSConfig):
+        with config.engine.connect() as con:
+            macros = con.execute(text('SELECT * FROM macro')).mappings().all()
+            devices = con.execute(text('SELECT macro_fk, position, device_name FROM macro_device')).all()
+            ignores = con.execute(text('SELECT macro_fk, ignored_when_macro_fk FROM macro_ignore')).all()
+            ignoring = {zmacro for zmacro, in con.execute(text('SELECT zmacro FROM zignoremacro'))}
+            states = con.execute(text('SELECT * FROM macro_state')).mappings().all()
+        config.engine.dispose()
+
+        pk_to_number = {macro['pk']: macro['macro_number'] for macro in macros}
+
+        macro_devices = {}
+        for macro_fk, position, device_name in devices:
+            macro_devices.setdefault(macro_fk, []).append((position, device_name))
+        macro_ignores = {}
+        for macro_fk, ignored_when_macro_fk in ignores:
+            macro_ignores.setdefault(macro_fk, []).append(pk_to_number.get(ignored_when_macro_fk))
+
+        for macro in macros:
+            pk = macro['pk']
+            self.macros[macro['macro_number']] = content_hash(row_content(macro, ('pk',)),
+                                                              sorted(macro_devices.get(pk, [])),
+                                                              sorted(macro_ignores.get(pk, []), key=repr),
+                                                              pk in ignoring)
+        for state in states:
+            key = (pk_to_number.get(state['macro_fk']), state['state_number'])
+            self.states[key] = content_hash(row_content(state, ('macro_fk',)))
+
+    def read_faults(self, config: MPSConfig):
+        with config.engine.connect() as con:
+            for table, query in FAULT_QUERIES.items():
+                for fault in con.execute(text(query)).mappings():
+                    self.faults[fault['fault_number']] = content_hash(table, row_content(fault, ('fault_id',)))
+        config.engine.dispose()
+
+    def diff(self, old):
+        """What changed from an older version's digest to this one"""
+        return VersionDiff(old, self)
+
+
+class VersionDiff:
+    """
+    author: Evren Keskin
+    ===================================================================
+    The macros, states and faults that were added, removed or changed between two versions.
+    Each of them is a set of keys: macro numbers, (macro number, state number) pairs or fault numbers.
+    An empty diff means the two versions have the same content, and nothing needs to be reloaded.
+    ===================================================================
+    """
+    KINDS = ('macros', 'states', 'faults')
+
+    def __init__(self, old: VersionDigest, new: VersionDigest):
+        for kind in self.KINDS:
+            old_hashes, new_hashes = getattr(old, kind), getattr(new, kind)
+            setattr(self, f'added_{kind}', new_hashes.keys() - old_hashes.keys())
+            setattr(self, f'removed_{kind}', old_hashes.keys() - new_hashes.keys())
+            setattr(self, f'changed_{kind}', {key for key in new_hashes.keys() & old_hashes.keys()
+                                              if new_hashes[key] != old_hashes[key]})
+
+    def is_empty(self):
+        return not any(getattr(self, f'{change}_{kind}')
+                       for change in ('added', 'removed', 'changed') for kind in self.KINDS)
+
+    def changes_rows(self):
+        """True if a table of macros or faults gains or loses rows, False if only row contents change"""
+        return bool(self.added_macros or self.removed_macros or self.added_faults or self.removed_faults)
+
+    def changed_macro_numbers(self):
+        """The macros that are in both versions, but whose row or states are different"""
+        state_macros = {macro_number for macro_number, state_number in
+                        self.added_states | self.removed_states | self.changed_states}
+        return (self.changed_macros | state_macros) - self.added_macros - self.removed_macros
+
+    def summary(self):
+        """A one line description of the diff, for logs"""
+        if self.is_empty():
+            return 'no changes'
+        parts = []
+        for kind in self.KINDS:
+            for change in ('added', 'removed', 'changed'):
+                count = len(getattr(self, f'{change}_{kind}'))
+                if count:
+                    parts.append(f'{count} {kind} {change}')
+        return ', '.join(parts)
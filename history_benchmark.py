@@ -0,0 +1,104 @@
+import os
+import time
+import statistics
+import tempfile
+from argparse import ArgumentParser
+from dbinteraction.historyDB.history_backend import SQLiteHistoryBackend
+from dbinteraction.historyDB.history_cache import HistoryCache
+from dbinteraction.historyDB.generate_history_db import generate_history, MESSAGES_PER_HOUR
+from models.all_messages_model import AllMessagesModel
+from mps_constants import FROM_1970_TO_1990_IN_SECONDS
+
+
+class HistoryBenchmark():
+    """
+    author: Evren Keskin
+    =====================================================================
+    Times the history side of the GUI end to end, without the production database.
+    AllMessagesModel reads a SQLite stand in of the history database,
+    filled with made up messages by generate_history_db unless a file is given.
+
+    Measures:
+    1) Startup, the first 8 hours the model loads when it is made
+    2) Interval queries, first with an empty cache and then again once cached
+    3) Live refreshes, each one after a second of new messages is written to the history database
+    =====================================================================
+    """
+    def __init__(self):
+        parser = ArgumentParser(prog="History Benchmark")
+        parser.add_argument("--historyDB", default=None, help="history SQLite file, a generated one if not given")
+        parser.add_argument("--hours", type=float, default=24, help="hours of history to generate and query")
+        parser.add_argument("--rate", type=int, default=MESSAGES_PER_HOUR, help="generated messages per hour")
+        parser.add_argument("--repeats", type=int, default=5)
+        parser.add_argument("--refreshes", type=int, default=10)
+        parser.add_argument("--liveMessages", type=int, default=50, help="new messages before each live refresh")
+        self.args = parser.parse_args()
+
+    def now(self):
+        return int(time.time() - FROM_1970_TO_1990_IN_SECONDS)
+
+    def report(self, name, timings, count=None):
+        line = (f'{name:<28} min {min(timings) * 1000:9.1f} ms   '
+                f'median {statistics.median(timings) * 1000:9.1f} ms   max {max(timings) * 1000:9.1f} ms')
+        if count is not None:
+            line += f'   {count} messages'
+        print(line)
+
+    def run(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = self.args.historyDB
+            if filename is None:
+                filename = os.path.join(tmp_dir, 'history.sqlite')
+                end = self.now()
+                counts = generate_history(filename, end - int(self.args.hours * 3600), end,
+                                          messages_per_hour=self.args.rate)
+                print(f'Generated {sum(counts.values())} messages over {self.args.hours} hours')
+            backend = SQLiteHistoryBackend(filename)
+
+            timings = []
+            for _ in range(self.args.repeats):
+                start_time = time.perf_counter()
+                model = AllMessagesModel(backend=backend)
+                timings.append(time.perf_counter() - start_time)
+            self.report('startup (8 hours)', timings, len(model.liveMessages))
+
+            end = self.now()
+            start = end - int(self.args.hours * 3600)
+            cold, warm = [], []
+            for _ in range(self.args.repeats):
+                model = AllMessagesModel(backend=backend)
+                # The model cached the last 8 hours when it was made, the cold query starts from nothing
+                model.cache = HistoryCache()
+                start_time = time.perf_counter()
+                model.update_interval_messages(start, end)
+                cold.append(time.perf_counter() - start_time)
+                start_time = time.perf_counter()
+                model.update_interval_messages(start, end)
+                warm.append(time.perf_counter() - start_time)
+            count = len(model.interactiveMessages)
+            self.report(f'interval ({self.args.hours} hours) cold', cold, count)
+            self.report(f'interval ({self.args.hours} hours) warm', warm, count)
+
+            if self.args.historyDB is None:
+                # Only a generated database gets new messages written to it
+                timings = []
+                new_messages = 0
+                for refresh in range(self.args.refreshes):
+                    # New messages land in the next second after the last refresh,
+                    # which has to be over before a refresh can see all of them
+                    start = model.check_end_time
+                    generate_history(filename, start, start + 1, seed=refresh + 1,
+                                     messages_per_hour=self.args.liveMessages * 3600)
+                    while self.now() <= start:
+                        time.sleep(0.05)
+                    start_time = time.perf_counter()
+                    new_messages += len(model.update_live_messages())
+                    model.evict_old_live_messages()
+                    timings.append(time.perf_counter() - start_time)
+                self.report('live refresh', timings, new_messages)
+
+            backend.engine.dispose()
+
+
+if __name__ == "__main__":
+    HistoryBenchmark().run()
@@ -34,7 +34,7 @@ class ALLFaultsModel:
                 logger.error("File does not exist. Using default .db file.")
             self.filename = self.set_filename(accel_type)
 
-        self.configurator = MPSConfig(self.filename)
+        self.configurator = MPSConfig(self.filename, read_only=True)
 
         self.set_all_node_fault_attributes()
 
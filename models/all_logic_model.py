@@ -33,7 +33,7 @@ class AllLogicModel:
                 logger.error("File does not exist. Using default .db file.")
             self.filename = self.set_filename(accel_type)
 
-        self.configurator = MPSConfig(self.filename)
+        self.configurator = MPSConfig(self.filename, read_only=True)
         self.configDB = configDB
         self.linactype = accel_type
 
@@ -1,8 +1,11 @@
-from dbinteraction.historyDB.oracle_utilities import (get_beam_destinations, get_beam_rates,
-                                                      get_bypass_times, get_bypass_values, get_faults)
-from models.prepped_message import PreppedMessage
+from dbinteraction.historyDB.history_backend import OracleHistoryBackend
+from dbinteraction.historyDB.history_cache import HistoryCache
+from models.message_columns import MessageColumns, MessageValues
 import time
-from mps_constants import FROM_1970_TO_1990_IN_SECONDS
+from concurrent.futures import ThreadPoolExecutor
+from mps_constants import (FROM_1970_TO_1990_IN_SECONDS, HISTORY_DEFAULT_MESSAGE_TYPES,
+                           HISTORY_OVERVIEW_BUCKET_SECONDS, HISTORY_QUERY_THREADS,
+                           LIVE_MESSAGES_MAX, LIVE_MESSAGES_MAX_AGE_SECONDS)
 
 
 class AllMessagesModel:
@@ -16,72 +19,191 @@ class AllMessagesModel:
     1) Create a list of messages with oracle queries
     2) Begin listening for new messages, updating message list continuously
     3) Create option for getting a specific time range of messages
-    """
-    def __init__(self, wallet):
-        self.liveMessages = []
-        self.interactiveMessages = []
-        self.check_end_time = int(time.time() - FROM_1970_TO_1990_IN_SECONDS)
-        self.walletName = wallet
-        # 8 hours ago
-        self.check_start_time = self.check_end_time - 3600 * 8
-
-        # Initialize new messages with the starting interval from above:
-        newMessages = self.get_messages_in_interval(self.check_start_time, self.check_end_time)
-        for message in newMessages:
-            self.liveMessages.append(message)
-
-    def get_messages_in_interval(self, start, end):
-        messages = []
-        beam_destination_messages = get_beam_destinations(start, 0, end, 0, self.walletName)
-
-        if not (beam_destination_messages == [] or beam_destination_messages is None):
-            for bdm in beam_destination_messages:
-                newMessage = PreppedMessage()
-                newMessage.set_beam_dest_message(bdm.prev_name, bdm.curr_name, bdm.sec, bdm.nsec)
-                messages.append(newMessage)
-
-        beam_rates_messages = get_beam_rates(start, 0, end, 0, self.walletName)
-
-        if not (beam_rates_messages == [] or beam_rates_messages is None):
-            for brm in beam_rates_messages:
-                newMessage = PreppedMessage()
-                newMessage.set_beam_rate_message(brm[2], brm[3], brm[4], brm[0], brm[1])
-                messages.append(newMessage)
-
-        bypass_time_messages = get_bypass_times(start, 0, end, 0, self.walletName)
 
-        if not (bypass_time_messages == [] or bypass_time_messages is None):
-            for btm in bypass_time_messages:
-                newMessage = PreppedMessage()
-                newMessage.set_bypass_time_message(btm[2], btm[3], btm[4], btm[0], btm[1])
-                messages.append(newMessage)
+    The five history queries of an interval are independent,
+    so they are run at the same time on a small thread pool shared by all instances
 
-        bypass_value_messages = get_bypass_values(start, 0, end, 0, self.walletName)
+    Every row read from the history database is kept in a local HistoryCache,
+    so an interval only queries the history database for the parts the cache does not cover yet
 
-        if not (bypass_value_messages == [] or bypass_value_messages is None):
-            for bvm in bypass_value_messages:
-                newMessage = PreppedMessage()
-                newMessage.set_bypass_value_message(bvm[2], bvm[3], btm[4], bvm[5], bvm[0], bvm[1])
-                messages.append(newMessage)
+    The history database is read through a HistoryBackend,
+    Oracle with the given wallet unless another backend is given
 
-        faults_messages = get_faults(start, 0, end, 0, self.walletName)
+    liveMessages are kept newest first, and bounded by LIVE_MESSAGES_MAX
+    and LIVE_MESSAGES_MAX_AGE_SECONDS, so a display left open for days does not keep growing.
+    The cache drops its rows past the same age, but keeps everything from the start
+    of the latest interactive interval, so searching that interval again stays local
 
-        if not (faults_messages == [] or faults_messages is None):
-            for fm in faults_messages:
-                newMessage = PreppedMessage()
-                newMessage.set_fault_message(fm[2], fm[3], fm[4], fm[5], fm[0], fm[1])
-                messages.append(newMessage)
+    Messages are kept as MessageColumns, which share this model's interned MessageValues.
+    liveMessages and interactiveMessages are only ever changed in place,
+    so a table model can show them directly
 
-        messages.sort()
+    Only the message types in enabled_types are queried, for the live messages and for intervals,
+    the history tables of the other types are never read
+    """
+    query_pool = ThreadPoolExecutor(max_workers=HISTORY_QUERY_THREADS, thread_name_prefix='history_query')
+
+    def __init__(self, wallet=None, backend=None):
+        if backend is None:
+            backend = OracleHistoryBackend(wallet)
+        self.backend = backend
+        self.history_queries = {'BD': backend.get_beam_destinations, 'BR': backend.get_beam_rates,
+                                'BT': backend.get_bypass_times, 'BV': backend.get_bypass_values,
+                                'F': backend.get_faults}
+        self.cache = HistoryCache()
+        self.cache_evicted_before = None
+        self.interactive_start = None
+        self.enabled_types = frozenset(HISTORY_DEFAULT_MESSAGE_TYPES)
+        self.values = MessageValues()
+        self.interactiveMessages = MessageColumns(self.values)
+        self.check_end_time = int(time.time() - FROM_1970_TO_1990_IN_SECONDS)
+        self.walletName = wallet
+        # 8 hours ago
+        self.check_start_time = self.check_end_time - 3600 * 8
+        self.live_start_time = self.check_start_time
 
-        return messages
+        # Initialize new messages with the starting interval from above:
+        self.liveMessages = self.get_messages_in_interval(self.check_start_time, self.check_end_time)
+        self.evict_old_live_messages()
+
+    def fetch_uncovered(self, start, end, message_types):
+        """
+        Query the history database for every part of the interval the cache does not cover
+        for each of message_types, and cache it
+        """
+        # Send out all the queries first, then wait for each of them
+        # so the whole interval takes about as long as the slowest query
+        futures = []
+        for message_type in message_types:
+            query = self.history_queries[message_type]
+            for gap_start, gap_end in self.cache.get_gaps(message_type, start, end):
+                future = self.query_pool.submit(query, gap_start, 0, gap_end, 0)
+                futures.append((message_type, gap_start, gap_end, future))
+
+        for message_type, gap_start, gap_end, future in futures:
+            self.cache.insert_rows(message_type, future.result())
+            self.cache.add_coverage(message_type, gap_start, gap_end)
+
+    def get_messages_in_interval(self, start, end, search_text=''):
+        """
+        Get the messages from start to end, newest first
+        search_text only keeps the messages with it in their message text,
+        found through the cache's full text index
+        """
+        message_types = self.get_enabled_types()
+        self.fetch_uncovered(start, end, message_types)
+        # Every list of rows is already newest first, so each type's messages come out sorted
+        # and the five of them only need to be merged together on their times
+        blocks = [MessageColumns.from_rows(self.values, message_type,
+                                           self.cache.select_rows(message_type, start, end, search_text))
+                  for message_type in message_types]
+        return MessageColumns.merge(self.values, blocks)
+
+    def get_enabled_types(self):
+        """The enabled message types, in the order of the history queries"""
+        enabled_types = self.enabled_types
+        return [message_type for message_type in self.history_queries if message_type in enabled_types]
+
+    def set_enabled_types(self, message_types):
+        """
+        Choose the message types that are fetched from now on
+        The set is swapped whole, so a fetch running on another thread sees either the old or the new one
+        """
+        self.enabled_types = frozenset(message_types)
+
+    def get_overview(self, start, end, bucket_seconds=HISTORY_OVERVIEW_BUCKET_SECONDS):
+        """
+        Count the messages from start up to end of each message type and device, in buckets of bucket_seconds
+        The history database does the counting, so this only gets one row for each of those, not every message
+        Only the enabled message types are counted, the same ones an interval search of a bucket finds
+        Returns (bucket start, bucket end, message type, device name, message count) rows, newest bucket first
+        """
+        message_types = self.get_enabled_types()
+        if not message_types:
+            return []
+        overview = []
+        for bucket, message_type, device_name, count in self.backend.get_overview(start, end, bucket_seconds,
+                                                                                  message_types):
+            bucket_start = start + int(bucket) * bucket_seconds
+            overview.append((bucket_start, min(bucket_start + bucket_seconds, end), message_type, device_name, count))
+        return overview
+
+    def fetch_live_messages(self):
+        """
+        Get the messages since the last live update, newest first, without adding them to liveMessages
+        The live interval only moves forward once its messages are fetched, a failed fetch is tried again next time
+        """
+        end = int(time.time() - FROM_1970_TO_1990_IN_SECONDS)
+        newMessages = self.get_messages_in_interval(self.check_end_time, end)
+        self.check_start_time = self.check_end_time
+        self.check_end_time = end
+        return newMessages
+
+    def fetch_live_window(self):
+        """
+        Get every message of the enabled types that belongs in liveMessages, newest first
+        Used when the enabled types change, the types that stay enabled are all read from the cache
+        """
+        start = max(self.live_start_time, self.check_end_time - LIVE_MESSAGES_MAX_AGE_SECONDS)
+        return self.get_messages_in_interval(start, self.check_end_time)
+
+    def add_live_messages(self, newMessages):
+        """Put newly fetched messages at the front of liveMessages"""
+        self.liveMessages.prepend(newMessages)
+
+    def replace_live_messages(self, messages):
+        """Make liveMessages hold just these newest first messages, in place"""
+        self.liveMessages.remove(0, len(self.liveMessages))
+        self.liveMessages.extend(messages)
 
     def update_live_messages(self):
-        self.check_start_time = self.check_end_time
-        self.check_end_time = int(time.time() - FROM_1970_TO_1990_IN_SECONDS)
-        newMessages = self.get_messages_in_interval(self.check_start_time, self.check_end_time)
-        for message in newMessages:
-            self.liveMessages.append(message)
+        """Put the messages since the last update at the front of liveMessages, and return them"""
+        newMessages = self.fetch_live_messages()
+        self.add_live_messages(newMessages)
+        return newMessages
+
+    def count_old_live_messages(self):
+        """Count the oldest liveMessages that are past the count and age limits"""
+        oldest_kept = self.check_end_time - LIVE_MESSAGES_MAX_AGE_SECONDS
+        seconds = self.liveMessages.seconds
+        keep = min(len(seconds), LIVE_MESSAGES_MAX)
+        while keep > 0 and seconds[keep - 1] < oldest_kept:
+            keep -= 1
+        return len(seconds) - keep
+
+    def evict_old_live_messages(self):
+        """
+        Drop the oldest liveMessages past the count and age limits
+        Returns how many were dropped, always from the end of liveMessages
+        """
+        evicted = self.count_old_live_messages()
+        if evicted:
+            self.liveMessages.remove(len(self.liveMessages) - evicted, len(self.liveMessages))
+        self.evict_old_cache_rows()
+        return evicted
+
+    def keep_cached_from(self, start):
+        """Keep the cached rows from start on, the start of the interval the interactive view is showing"""
+        self.interactive_start = start
+
+    def evict_old_cache_rows(self):
+        """Drop the cached history rows past the live age limit that the interactive interval does not need"""
+        cutoff = self.check_end_time - LIVE_MESSAGES_MAX_AGE_SECONDS
+        if self.interactive_start is not None:
+            cutoff = min(cutoff, self.interactive_start)
+        if self.cache_evicted_before is not None and cutoff <= self.cache_evicted_before:
+            return
+        self.cache.evict_before(cutoff)
+        self.cache_evicted_before = cutoff
 
     def update_interval_messages(self, startSeconds, endSeconds):
-        self.interactiveMessages = self.get_messages_in_interval(startSeconds, endSeconds)
+        messages = self.get_messages_in_interval(startSeconds, endSeconds)
+        self.clear_interactive_messages()
+        self.add_interactive_messages(messages)
+
+    def clear_interactive_messages(self):
+        self.interactiveMessages.remove(0, len(self.interactiveMessages))
+
+    def add_interactive_messages(self, messages):
+        """Put the messages of an older chunk of the interactive search at the end of interactiveMessages"""
+        self.interactiveMessages.extend(messages)
@@ -23,6 +23,8 @@ class FaultTableModel(QAbstractTableModel):
     __init__: used to create the table header, the hidden columns, and initialize what the user first sees
     set_data: used to set the table row data based on ALLFaultsModel info. This is what the user sees
     set_accepted: sets the shown column based on accepted checkboxes
+    set_fault_model: swaps in the ALLFaultsModel of a new config version with one model reset
+    patch_fault_model: swaps it in by rebuilding only the rows of the faults that changed
     """
     logger = getLogger(__name__)
 
@@ -86,31 +88,51 @@ class FaultTableModel(QAbstractTableModel):
         Set the color to white (for disconnected).
         ???
         """
-        for index, fault_num in enumerate(self.fault_model.nums_to_faults):
-            lst = [self.fault_model.get_fault_by_num(fault_num).fault_name] * len(self.hdr_lst)
-            lst[0] = self.fault_model.get_fault_by_num(fault_num).pv
-            if self.fault_model.get_fault_by_num(fault_num).fault_type == EF:
-                lst[1] = self.all_types[0]
-            elif self.fault_model.get_fault_by_num(fault_num).fault_type == LNF:
-                lst[1] = self.all_types[1]
-            elif self.fault_model.get_fault_by_num(fault_num).fault_type == LNCF:
-                lst[1] = self.all_types[2]
-            else:  # self.fault_model.get_fault_by_num(fault).fault_type == LPF:
-                lst[1] = self.all_types[3]
-
-            if lst[1] in self.accepted_types:
-                lst[2] = 'Y'
-            else:
-                lst[2] = 'N'
-
-            lst[3] = fault_num
-
-            self._data.append(lst)
-
+        for fault_num in self.fault_model.nums_to_faults:
+            self._data.append(self.build_row(fault_num))
             self.status.append(Statuses.WHT)
 
-            self.dataChanged.emit(self.index(index, 0),
-                                  self.index(index, 2))
+    def build_row(self, fault_num):
+        """Build the row of one fault, shown if its type is accepted"""
+        lst = [self.fault_model.get_fault_by_num(fault_num).fault_name] * len(self.hdr_lst)
+        lst[0] = self.fault_model.get_fault_by_num(fault_num).pv
+        if self.fault_model.get_fault_by_num(fault_num).fault_type == EF:
+            lst[1] = self.all_types[0]
+        elif self.fault_model.get_fault_by_num(fault_num).fault_type == LNF:
+            lst[1] = self.all_types[1]
+        elif self.fault_model.get_fault_by_num(fault_num).fault_type == LNCF:
+            lst[1] = self.all_types[2]
+        else:  # self.fault_model.get_fault_by_num(fault).fault_type == LPF:
+            lst[1] = self.all_types[3]
+
+        if lst[1] in self.accepted_types:
+            lst[2] = 'Y'
+        else:
+            lst[2] = 'N'
+
+        lst[3] = fault_num
+        return lst
+
+    def set_fault_model(self, fault_model: ALLFaultsModel):
+        """
+        Show the faults of a new config version.
+        All rows are rebuilt inside a single model reset, the type checkboxes still apply.
+        """
+        self.beginResetModel()
+        self.fault_model = fault_model
+        self.set_data()
+        self.endResetModel()
+
+    def patch_fault_model(self, fault_model: ALLFaultsModel, fault_numbers):
+        """
+        Show the faults of a new config version that only changed the contents of some faults.
+        Only the rows of fault_numbers are rebuilt, so the view keeps its selection and scroll position.
+        """
+        self.fault_model = fault_model
+        for row, lst in enumerate(self._data):
+            if lst[self.num_ind] in fault_numbers:
+                self._data[row] = self.build_row(lst[self.num_ind])
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.hdr_lst) - 1))
 
     def set_accepted(self):
         """
@@ -6,11 +6,14 @@ from qtpy.QtWidgets import (QStyledItemDelegate, QApplication, QToolTip)
 from .enums import Statuses
 from models.all_logic_model import AllLogicModel
 from models.prepped_macro_state import PreppedMacroState
-from epics import PV
+from pv_subscriptions import PVSubscriptionManager
 from datetime import datetime
 import numpy
 from mps_constants import FROM_1970_TO_1990_IN_SECONDS, BYPASS_FAULT_NUMBERS_POSTFIX, BYPASS_SECONDS_POSTFIX
 
+ALWAYS_EVALUATED_NUMBER = -42069
+"""The macro number of the always evaluated row, no real macro has it"""
+
 
 class LogicTableModel(QAbstractTableModel):
     """
@@ -28,6 +31,8 @@ class LogicTableModel(QAbstractTableModel):
     set_initial_data: used to set the table row data based on AllLogicModel info. This is what the user sees
     update_current_states: gets the retrieved list of current states for each macro,
         which is used to update the data to the accurate states for the user
+    set_logic_model: swaps in the AllLogicModel of a new config and logic version with one model reset
+    patch_logic_model: swaps it in by rebuilding only the rows of the macros that changed
     """
     logger = getLogger(__name__)
 
@@ -58,15 +63,12 @@ class LogicTableModel(QAbstractTableModel):
         self.status = []  # used to determine if a data row is in a warning or red state to show on summary
         self.channels = []  # channels used to copy the name of the logic item easily with middle click
 
-        self.bypass_seconds_PV = PV(IOC_PREFIX + BYPASS_SECONDS_POSTFIX)
-        self.bypassed_faults_PV = PV(IOC_PREFIX + BYPASS_FAULT_NUMBERS_POSTFIX)
+        subscriptions = PVSubscriptionManager.instance()
+        self.bypass_seconds_PV = subscriptions.get_pv(IOC_PREFIX + BYPASS_SECONDS_POSTFIX)
+        self.bypassed_faults_PV = subscriptions.get_pv(IOC_PREFIX + BYPASS_FAULT_NUMBERS_POSTFIX)
 
         self.set_initial_data(accel_type)
 
-        # Two flag system to stagger updates in case the current states are asked to update before an update is finished
-        self.isBeingUpdated = False
-        self.isWaitingToUpdateAgain = False
-
     def rowCount(self, index: QModelIndex = QModelIndex()):
         """Return the number of rows in the model."""
         return len(self._data)
@@ -149,85 +151,127 @@ class LogicTableModel(QAbstractTableModel):
         """
         self._data = []
         self.status = []
+        self.channels = []
 
         seconds = self.bypass_seconds_PV.value
         bypassed_faults = self.bypassed_faults_PV.value
 
-        for index, macro_num in enumerate(self.model.numbersToPreppedDevices):
-            cur_state = self.model.numbersToPreppedDevices[macro_num].get_current_state()
-            lst = [cur_state.state_name] * len(self.hdr_lst)
-            lst[0] = self.model.numbersToPreppedDevices[macro_num].macro_name
-            lst[1] = cur_state.state_name
-            if self.model.numbersToPreppedDevices[macro_num].has_special_error_state:
-                lst[2] = PreppedMacroState.get_enum_to_val(11)  # Ignore Logic
-            else:
-                lst[2] = PreppedMacroState.get_enum_to_val(cur_state.get_min_rate())
-            lst[3] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[0])
-            lst[4] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[1])
-            lst[5] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[2])
-            if accel_type == 'LCLS':
-                lst[6] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[3])
-                lst[7] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[4])
-                lst[8] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[5])
-                lst[9] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[6])
-            lst[self.numind] = macro_num
-            if cur_state.is_ignored:
-                lst[self.iind] = 'Y'
-            else:
-                lst[self.iind] = 'N'
-
-            # For checking bypassing, we need to check the fault id in the bypassed list
-            hasAnyBypassedFault = False
-            lowestDuration = None
-            for fault in self.model.numbersToPreppedDevices[macro_num].faults:
-                if fault.fault_number in bypassed_faults:
-                    hasAnyBypassedFault = True
-                    second_index = numpy.where(bypassed_faults == fault.fault_number)[0]
-                    if lowestDuration is None or lowestDuration < seconds[second_index][0]:
-                        lowestDuration = seconds[second_index][0] + FROM_1970_TO_1990_IN_SECONDS
-
-            if not hasAnyBypassedFault:
-                lst[self.bind] = 'N'
-                lst[self.beind] = 'None'
-            else:
-                # To set the duration, we find the lowest bypass duration of any of the faults
-                # So, if a code macro were to have many various durations, the lowest would be shown
-                lst[self.bind] = 'Y'
-                lst[self.beind] = datetime.fromtimestamp(lowestDuration)
-
-            if (self.model.numbersToPreppedDevices[macro_num].is_ignoring and
-                    cur_state.state_number == -55):
-                lst[self.miind] = 'Y'
-            else:
-                lst[self.miind] = 'N'
-
-            lst[self.mmrind] = self.model.numbersToPreppedDevices[macro_num].get_min_rate_from_ignored()
-
-            lst[self.cind] = 'Y' if self.model.numbersToPreppedDevices[macro_num].is_ignoring else 'N'
-            lst[self.aeind] = 'N'
-
+        for macro_num in self.model.numbersToPreppedDevices:
+            lst, status = self.build_row(macro_num, accel_type, seconds, bypassed_faults)
             self._data.append(lst)
+            self.status.append(status)
+            self.channels.append(self.model.numbersToPreppedDevices[macro_num].macro_name)
 
-            if (cur_state.get_min_rate() == -1 or
-                    cur_state.get_min_rate() == 2 or
-                    cur_state.get_min_rate() == 3 or
-                    cur_state.get_min_rate() == 8 or
-                    cur_state.get_min_rate() == 10):
-                self.status.append(Statuses.GRN)
-            elif cur_state.get_min_rate() == 0 or cur_state.get_min_rate() == 1 or cur_state.get_min_rate() == 9:
-                self.status.append(Statuses.RED)
-            elif (cur_state.get_min_rate() == 4 or
-                  cur_state.get_min_rate() == 5 or
-                  cur_state.get_min_rate() == 6 or
-                  cur_state.get_min_rate() == 7):
-                self.status.append(Statuses.YEL)
+        self.addAlwaysEvaluatedCondition(accel_type)
 
-            self.channels.append(self.model.numbersToPreppedDevices[macro_num].macro_name)
+    def set_logic_model(self, model: AllLogicModel, accel_type: str):
+        """
+        Show the macros of a new config and logic version.
+        All rows are rebuilt inside a single model reset, so the views and proxies
+        are told once, and keep their filters and sorting.
+        """
+        self.beginResetModel()
+        self.model = model
+        self.set_initial_data(accel_type)
+        self.endResetModel()
 
-            self.dataChanged.emit(self.index(index, 1),
-                                  self.index(index, self.conind[-1] - 1))
+    def patch_logic_model(self, model: AllLogicModel, accel_type: str, macro_numbers):
+        """
+        Show the macros of a new config and logic version that only changed the contents of some macros.
+        Only the rows of macro_numbers are rebuilt, so the views keep their selection and scroll position.
+        Returns False, without changing anything, if the new version does not have the same macros
+        in the same order, set_logic_model has to be used for it instead.
+        """
+        # The rows are matched by macro number, and have to be laid out the way set_initial_data does it:
+        # the macros in the model's order, which set_updated_data relies on, then the always evaluated row
+        row_numbers = [row[self.numind] for row in self._data]
+        if row_numbers != list(model.numbersToPreppedDevices) + [ALWAYS_EVALUATED_NUMBER]:
+            return False
+        rows = {macro_num: row for row, macro_num in enumerate(row_numbers)}
+        self.model = model
 
-        self.addAlwaysEvaluatedCondition(accel_type)
+        seconds = self.bypass_seconds_PV.value
+        bypassed_faults = self.bypassed_faults_PV.value
+        for macro_num in macro_numbers:
+            row = rows.get(macro_num)
+            if row is None:
+                continue
+            self._data[row], self.status[row] = self.build_row(macro_num, accel_type, seconds, bypassed_faults)
+            self.channels[row] = model.numbersToPreppedDevices[macro_num].macro_name
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.hdr_lst) - 1))
+
+        always_evaluated_row = rows[ALWAYS_EVALUATED_NUMBER]
+        self._data[always_evaluated_row][self.mmrind] = model.get_always_evaluated_macros_min()
+        self.dataChanged.emit(self.index(always_evaluated_row, self.mmrind),
+                              self.index(always_evaluated_row, self.mmrind))
+        return True
+
+    def build_row(self, macro_num, accel_type, seconds, bypassed_faults):
+        """
+        Build the row of one macro and its status, from its current state
+        and the bypass seconds and bypassed fault numbers PV values.
+        """
+        cur_state = self.model.numbersToPreppedDevices[macro_num].get_current_state()
+        lst = [cur_state.state_name] * len(self.hdr_lst)
+        lst[0] = self.model.numbersToPreppedDevices[macro_num].macro_name
+        lst[1] = cur_state.state_name
+        if self.model.numbersToPreppedDevices[macro_num].has_special_error_state:
+            lst[2] = PreppedMacroState.get_enum_to_val(11)  # Ignore Logic
+        else:
+            lst[2] = PreppedMacroState.get_enum_to_val(cur_state.get_min_rate())
+        lst[3] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[0])
+        lst[4] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[1])
+        lst[5] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[2])
+        if accel_type == 'LCLS':
+            lst[6] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[3])
+            lst[7] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[4])
+            lst[8] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[5])
+            lst[9] = PreppedMacroState.get_enum_to_val(cur_state.rate_enums[6])
+        lst[self.numind] = macro_num
+        if cur_state.is_ignored:
+            lst[self.iind] = 'Y'
+        else:
+            lst[self.iind] = 'N'
+
+        # For checking bypassing, we need to check the fault id in the bypassed list
+        hasAnyBypassedFault = False
+        lowestDuration = None
+        for fault in self.model.numbersToPreppedDevices[macro_num].faults:
+            if fault.fault_number in bypassed_faults:
+                hasAnyBypassedFault = True
+                second_index = numpy.where(bypassed_faults == fault.fault_number)[0]
+                if lowestDuration is None or lowestDuration < seconds[second_index][0]:
+                    lowestDuration = seconds[second_index][0] + FROM_1970_TO_1990_IN_SECONDS
+
+        if not hasAnyBypassedFault:
+            lst[self.bind] = 'N'
+            lst[self.beind] = 'None'
+        else:
+            # To set the duration, we find the lowest bypass duration of any of the faults
+            # So, if a code macro were to have many various durations, the lowest would be shown
+            lst[self.bind] = 'Y'
+            lst[self.beind] = datetime.fromtimestamp(lowestDuration)
+
+        if (self.model.numbersToPreppedDevices[macro_num].is_ignoring and
+                cur_state.state_number == -55):
+            lst[self.miind] = 'Y'
+        else:
+            lst[self.miind] = 'N'
+
+        lst[self.mmrind] = self.model.numbersToPreppedDevices[macro_num].get_min_rate_from_ignored()
+
+        lst[self.cind] = 'Y' if self.model.numbersToPreppedDevices[macro_num].is_ignoring else 'N'
+        lst[self.aeind] = 'N'
+
+        status = Statuses.GRN  # -1, 2, 3, 8 and 10, and any rate not listed below
+        if cur_state.get_min_rate() == 0 or cur_state.get_min_rate() == 1 or cur_state.get_min_rate() == 9:
+            status = Statuses.RED
+        elif (cur_state.get_min_rate() == 4 or
+              cur_state.get_min_rate() == 5 or
+              cur_state.get_min_rate() == 6 or
+              cur_state.get_min_rate() == 7):
+            status = Statuses.YEL
+        return lst, status
 
     def addAlwaysEvaluatedCondition(self, accel_type):
         """
@@ -248,7 +292,7 @@ class LogicTableModel(QAbstractTableModel):
             lst[7] = '--'
             lst[8] = '--'
             lst[9] = '--'
-        lst[self.numind] = -42069  # special key for the always evaluated condition
+        lst[self.numind] = ALWAYS_EVALUATED_NUMBER  # special key for the always evaluated condition
         lst[self.iind] = 'Y'
         lst[self.bind] = 'N'
         lst[self.miind] = '--'
@@ -344,25 +388,14 @@ class LogicTableModel(QAbstractTableModel):
         Called when the Current States PV info changes.
         Sets the new current states of the macro list from the macro model
         and resets all data of the table model
+        Only called on the GUI thread, with the latest current states, so updates never overlap
         """
-        if self.isBeingUpdated is False:
-            self.isBeingUpdated = True
-            # print('updating current logic states')
-
-            for macro in self.model.numbersToPreppedDevices.values():
-                # current states are indexed by their related macros
-                thisMacrosCurrentStateNumber = currentStateNumbers[macro.macro_number]
-                macro.set_current_state(thisMacrosCurrentStateNumber)
-
-            self.set_updated_data(accel_type)
-            self.isBeingUpdated = False
-            if self.isWaitingToUpdateAgain is True:
-                self.isWaitingToUpdateAgain = False
-                self.set_current_states(accel_type, currentStateNumbers)
-        elif self.isWaitingToUpdateAgain is False:
-            # Tried, and failed an update, so try to update again
-            # print('failed a current state update, will call update when current process finishes')
-            self.isWaitingToUpdateAgain = True
+        for macro in self.model.numbersToPreppedDevices.values():
+            # current states are indexed by their related macros
+            thisMacrosCurrentStateNumber = currentStateNumbers[macro.macro_number]
+            macro.set_current_state(thisMacrosCurrentStateNumber)
+
+        self.set_updated_data(accel_type)
 
     def less_than(self, left: QModelIndex, right: QModelIndex, sortorder: Qt.SortOrder):
         """Called by MPSSortFilterProxyModel to sort rows based on the
@@ -421,7 +454,11 @@ class LogicTableModel(QAbstractTableModel):
                     for macro in self.model.alwaysEvaluatedMacros:
                         ignored_nums.append(macro.macro_number)
                 else:
-                    for macro in self.model.numbersToPreppedDevices[int(text)].ignored_macros:
+                    # The condition may be gone after a new logic version was loaded
+                    condition = self.model.numbersToPreppedDevices.get(int(text))
+                    if condition is None:
+                        return False
+                    for macro in condition.ignored_macros:
                         ignored_nums.append(macro.macro_number)
 
                 if self._data[row][self.numind] not in ignored_nums:
@@ -0,0 +1,141 @@
+import threading
+from array import array
+from datetime import datetime
+from heapq import merge
+from models.prepped_message import format_message
+from mps_constants import FROM_1970_TO_1990_IN_SECONDS
+
+MESSAGE_TYPES = ('BD', 'BR', 'BT', 'BV', 'F')
+"""The message types, in the order of their type codes"""
+FIELD_COUNT = 4
+"""Most fields a history row has after its time, rows with fewer are padded with None"""
+MESSAGE_FIELD_COUNTS = {'BD': 2, 'BR': 3, 'BT': 3, 'BV': 4, 'F': 4}
+"""How many fields each message type's history rows have after the time"""
+
+
+class MessageValues:
+    """
+    author: Evren Keskin
+    ===================================================================
+    The interned device names, fault names and values of history messages.
+    Each distinct value is kept once and MessageColumns only hold its id,
+    so the same few thousand names are not stored again for every message.
+    Values are only ever added, so ids can be read from any thread.
+    ===================================================================
+    """
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+        self.lock = threading.Lock()
+
+    def intern(self, value):
+        """Get the id of a value, adding it if it is new"""
+        value_id = self.ids.get(value)
+        if value_id is None:
+            with self.lock:
+                value_id = self.ids.get(value)
+                if value_id is None:
+                    value_id = len(self.values)
+                    self.values.append(value)
+                    self.ids[value] = value_id
+        return value_id
+
+
+class MessageColumns:
+    """
+    author: Evren Keskin
+    ===================================================================
+    History messages stored as columns instead of one object per message.
+    Every message is its seconds and nanos since 1990, a type code from MESSAGE_TYPES,
+    and the ids of up to FIELD_COUNT interned row fields in a shared MessageValues.
+    The message text and date are only made when asked for,
+    which is just for the rows a table actually shows.
+    ===================================================================
+    """
+    def __init__(self, values: MessageValues):
+        self.values = values
+        self.seconds = array('q')
+        self.nanos = array('q')
+        self.types = array('B')
+        self.fields = [array('i') for _ in range(FIELD_COUNT)]
+
+    @classmethod
+    def from_rows(cls, values: MessageValues, message_type, rows):
+        """Make columns from the rows of one message type, as the history queries return them"""
+        columns = cls(values)
+        columns.seconds = array('q', [row[0] for row in rows])
+        columns.nanos = array('q', [row[1] for row in rows])
+        columns.types = array('B', [MESSAGE_TYPES.index(message_type)]) * len(rows)
+        for field in range(FIELD_COUNT):
+            position = field + 2
+            columns.fields[field] = array('i', [values.intern(row[position] if position < len(row) else None)
+                                                for row in rows])
+        return columns
+
+    @classmethod
+    def merge(cls, values: MessageValues, blocks):
+        """
+        Merge newest first columns into one newest first set of columns.
+        Only the (seconds, nanos, position) of each message go through the heap merge,
+        every column is then gathered by the merged positions in one pass.
+        """
+        combined = cls(values)
+        streams = []
+        for block in blocks:
+            streams.append(zip(block.seconds, block.nanos, range(len(combined), len(combined) + len(block))))
+            combined.extend(block)
+        if len(streams) == 1:
+            return combined
+
+        order = [position for _, _, position in merge(*streams, reverse=True)]
+        merged = cls(values)
+        merged.seconds = array('q', map(combined.seconds.__getitem__, order))
+        merged.nanos = array('q', map(combined.nanos.__getitem__, order))
+        merged.types = array('B', map(combined.types.__getitem__, order))
+        merged.fields = [array('i', map(field.__getitem__, order)) for field in combined.fields]
+        return merged
+
+    def __len__(self):
+        return len(self.seconds)
+
+    def columns(self):
+        return [self.seconds, self.nanos, self.types] + self.fields
+
+    def extend(self, other):
+        """Add other columns to the end, in place"""
+        for column, other_column in zip(self.columns(), other.columns()):
+            column.extend(other_column)
+
+    def prepend(self, other):
+        """Add other columns to the front, in place"""
+        for column, other_column in zip(self.columns(), other.columns()):
+            column[:0] = other_column
+
+    def remove(self, start, stop):
+        """Remove the messages from start up to stop, in place"""
+        for column in self.columns():
+            del column[start:stop]
+
+    def slice(self, start, stop=None):
+        """Get a copy of the messages from start up to stop"""
+        sliced = MessageColumns(self.values)
+        sliced.seconds = self.seconds[start:stop]
+        sliced.nanos = self.nanos[start:stop]
+        sliced.types = self.types[start:stop]
+        sliced.fields = [field[start:stop] for field in self.fields]
+        return sliced
+
+    def message_type(self, index):
+        return MESSAGE_TYPES[self.types[index]]
+
+    def message(self, index):
+        """Make the message text of one message"""
+        values = self.values.values
+        fields = [values[field[index]] for field in self.fields]
+        message_type = self.message_type(index)
+        # Only pass on the fields this message type has, the rest are padding
+        return format_message(message_type, fields[:MESSAGE_FIELD_COUNTS[message_type]])
+
+    def date(self, index):
+        """Make the local date and time of one message"""
+        return datetime.fromtimestamp(self.seconds[index] + FROM_1970_TO_1990_IN_SECONDS)
@@ -1,10 +1,109 @@
 from logging import getLogger
-from qtpy.QtCore import (Qt, QModelIndex, QAbstractTableModel,
-                         QSortFilterProxyModel)
+from qtpy.QtCore import (Qt, QModelIndex, QAbstractTableModel, QObject, QThread,
+                         QSortFilterProxyModel, Signal, Slot)
+from qtpy.QtWidgets import QApplication
 from .enums import Statuses
 from models.all_messages_model import AllMessagesModel
-from datetime import datetime
-from mps_constants import FROM_1970_TO_1990_IN_SECONDS
+from models.message_columns import MessageColumns
+from mps_constants import HISTORY_SEARCH_CHUNK_SECONDS
+
+
+class LiveMessagesPoller(QObject):
+    """
+    author: Evren Keskin
+    ===================================================================
+    A worker that lives on its own QThread and polls the history database for live messages.
+    It runs the history queries and merges the new messages into columns,
+    then hands the finished batch back to the GUI thread,
+    so a slow history database never holds up the rest of the display.
+    When the enabled message types change, it reloads every live message instead.
+    ===================================================================
+    """
+    poll_requested = Signal()
+    live_loaded = Signal(object)
+    poll_failed = Signal()
+    reload_requested = Signal()
+    live_reloaded = Signal(object)
+
+    def __init__(self, table_model):
+        super(LiveMessagesPoller, self).__init__()
+        self.table_model = table_model
+        self.message_model = table_model.message_model
+        self.poll_requested.connect(self.poll, Qt.QueuedConnection)
+        self.reload_requested.connect(self.reload, Qt.QueuedConnection)
+
+    @Slot()
+    def poll(self):
+        """Fetch the new live messages, then send them to the table model, and drop the cache rows that got too old"""
+        try:
+            newMessages = self.message_model.fetch_live_messages()
+            self.message_model.evict_old_cache_rows()
+        except Exception:
+            MessageTableModel.logger.exception('Live history poll failed')
+            self.poll_failed.emit()
+            return
+
+        self.live_loaded.emit(newMessages)
+
+    @Slot()
+    def reload(self):
+        """Fetch every live message of the enabled types, then send them to the table model"""
+        try:
+            messages = self.message_model.fetch_live_window()
+        except Exception:
+            MessageTableModel.logger.exception('Live history reload failed')
+            return
+
+        self.live_reloaded.emit(messages)
+
+
+class IntervalSearchWorker(QObject):
+    """
+    author: Evren Keskin
+    ===================================================================
+    A worker that lives on its own QThread and runs interactive history searches.
+    The searched range is fetched in HISTORY_SEARCH_CHUNK_SECONDS chunks, newest first,
+    and every chunk is sent to the GUI thread as soon as it is ready,
+    so the table fills in while the rest of the range is still being fetched.
+    A search stops between chunks once the table model has moved on to another generation.
+    A search text is matched in the history cache, so only the matching messages reach the table.
+    ===================================================================
+    """
+    search_requested = Signal(int, int, int, str)
+    chunk_loaded = Signal(int, object, int)
+    search_finished = Signal(int)
+
+    def __init__(self, table_model):
+        super(IntervalSearchWorker, self).__init__()
+        self.table_model = table_model
+        self.message_model = table_model.message_model
+        self.search_requested.connect(self.search, Qt.QueuedConnection)
+
+    @Slot(int, int, int, str)
+    def search(self, generation, start, end, search_text):
+        """
+        Fetch the messages from start to end that match search_text a chunk at a time,
+        sending each chunk to the table model
+        """
+        chunk_end = end
+        try:
+            while chunk_end > start:
+                if generation != self.table_model.search_generation:
+                    return  # cancelled, or a newer search replaced this one
+                chunk_start = max(start, chunk_end - HISTORY_SEARCH_CHUNK_SECONDS)
+                messages = self.message_model.get_messages_in_interval(chunk_start, chunk_end, search_text)
+                if chunk_end != end:
+                    # Rows right on the chunk end were already in the newer chunk
+                    newer = 0
+                    while newer < len(messages) and messages.seconds[newer] >= chunk_end:
+                        newer += 1
+                    messages = messages.slice(newer)
+
+                self.chunk_loaded.emit(generation, messages, end - chunk_start)
+                chunk_end = chunk_start
+        except Exception:
+            MessageTableModel.logger.exception('Interactive history search failed')
+        self.search_finished.emit(generation)
 
 
 class MessageTableModel(QAbstractTableModel):
@@ -15,6 +114,9 @@ class MessageTableModel(QAbstractTableModel):
     It is used as a connection between the UI display in history_ui,
     and the models of retrieved data from AllMessagesModel.
     It holds the rows of data that is used for table display in '_data'.
+    '_data' is the message model's own MessageColumns of live or interactive messages,
+    so rows are added and removed through this model to send the right notifications,
+    and the text of a row is only made when data() asks for it.
     For now, it is hard coded for LCLS use
     but can easily be adapted for more flexibility
     ===================================================================
@@ -27,6 +129,8 @@ class MessageTableModel(QAbstractTableModel):
     set_accepted: sets the shown column based on accepted checkboxes
     """
     logger = getLogger(__name__)
+    search_progress = Signal(int, int)
+    search_done = Signal()
 
     def __init__(self, parent, messages_model: AllMessagesModel):
         super(MessageTableModel, self).__init__(parent)
@@ -34,9 +138,15 @@ class MessageTableModel(QAbstractTableModel):
 
         self.hdr_lst = (["Date", "Message"])
 
-        self._data = []  # table data, which will hold inputs from database
-        self.status = []
+        self._data = MessageColumns(messages_model.values)  # table data, which will hold inputs from database
         self.filteringThatOneMessage = False
+        self.poller = None
+        self.is_polling = False
+        self.searcher = None
+        self.search_generation = 0
+        self.is_searching = False
+        self.search_total = 0
+        self.worker_thread = None
 
     def rowCount(self, index: QModelIndex = QModelIndex()):
         """Return the number of rows in the model."""
@@ -46,35 +156,45 @@ class MessageTableModel(QAbstractTableModel):
         """Return the number of columns in the model."""
         return len(self.hdr_lst)
 
-    def insertRows(self, new_row, position, rows, parent=QModelIndex()):
-        """
-        Insert a new message row at the top or bottom based on position negativity
-        Negative inserts are from the top, and positives are from the bottom
-        """
-        if position >= 0:
-            self.beginInsertRows(parent, 0, 0)
-            self._data.insert(position, new_row)
-            self.endInsertRows()
-        else:
-            self.beginInsertRows(parent, 0, 0)
-            self._data.append(new_row)
-            self.endInsertRows()
-        return True
-
     def removeRows(self, position, rows, parent=QModelIndex()):
-        start, end = position, rows
-        self.beginRemoveRows(parent, start, end)
-        del self._data[start:end + 1]
+        """Remove a number of rows, starting at a position"""
+        if rows <= 0:
+            return False
+        self.beginRemoveRows(parent, position, position + rows - 1)
+        self._data.remove(position, position + rows)
         self.endRemoveRows()
         return True
 
+    def prepend_rows(self, messages: MessageColumns):
+        """Insert a batch of messages at the top, with one row insert notification"""
+        if not len(messages):
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self._data.prepend(messages)
+        self.endInsertRows()
+
+    def append_rows(self, messages: MessageColumns):
+        """Add a batch of messages at the bottom, with one row insert notification"""
+        if not len(messages):
+            return
+        first = len(self._data)
+        self.beginInsertRows(QModelIndex(), first, first + len(messages) - 1)
+        self._data.extend(messages)
+        self.endInsertRows()
+
+    def display_text(self, row, column):
+        """Make the text of one cell, the date or the message"""
+        if column == 0:
+            return str(self._data.date(row))
+        return self._data.message(row)
+
     def data(self, index: QModelIndex, role: Qt.ItemDataRole):
         """Return the index's text, alignment, background color,
         OR foreground color."""
         if not index.isValid():
             return
         elif role == Qt.DisplayRole:
-            return str(self._data[index.row()][index.column()])
+            return self.display_text(index.row(), index.column())
         elif role == Qt.TextAlignmentRole and 0 < index.column():
             return Qt.AlignCenter
         # elif role == Qt.BackgroundRole:
@@ -83,7 +203,7 @@ class MessageTableModel(QAbstractTableModel):
             row = index.row()
             col = index.column()
             if col != 0:
-                return self.status[row].brush()
+                return self.get_status_from_type(self._data.message_type(row)).brush()
             return Qt.black
 
     def headerData(self, section: int, orientation: Qt.Orientation,
@@ -93,48 +213,129 @@ class MessageTableModel(QAbstractTableModel):
             return self.hdr_lst[section]
 
     def initialize_live(self):
-        self.lastLiveIndex = 0
-        liveMessages = self.message_model.liveMessages
-        for index, messageObj in enumerate(liveMessages):
-            lst = [messageObj.message] * len(self.hdr_lst)
-            lst[0] = datetime.fromtimestamp(messageObj.seconds_from_1990
-                                            + FROM_1970_TO_1990_IN_SECONDS)
-            lst[1] = messageObj.message
+        self.beginResetModel()
+        self._data = self.message_model.liveMessages
+        self.endResetModel()
 
-            self.status.append(self.get_status_from_type(messageObj.message_type))
+        # Live polls run on their own thread, the GUI thread only adds the finished rows
+        self.poller = LiveMessagesPoller(self)
+        self.poller.live_loaded.connect(self.add_live_rows, Qt.QueuedConnection)
+        self.poller.poll_failed.connect(self.end_poll, Qt.QueuedConnection)
+        self.poller.live_reloaded.connect(self.set_live_rows, Qt.QueuedConnection)
+        self.start_worker(self.poller)
 
-            self.insertRows(lst, self.lastLiveIndex, 1)
-            self.lastLiveIndex += 1
+    def start_worker(self, worker):
+        """Move a worker to this table's own thread, starting the thread on first use"""
+        if self.worker_thread is None:
+            self.worker_thread = QThread(self)
+            self.worker_thread.start()
+            QApplication.instance().aboutToQuit.connect(self.stop_worker)
+        worker.moveToThread(self.worker_thread)
 
     def update_live(self):
-        self.message_model.update_live_messages()
-        liveMessages = self.message_model.liveMessages[self.lastLiveIndex:]
-        for index, messageObj in enumerate(liveMessages):
-            lst = [messageObj.message] * len(self.hdr_lst)
-            lst[0] = datetime.fromtimestamp(messageObj.seconds_from_1990
-                                            + FROM_1970_TO_1990_IN_SECONDS)
-            lst[1] = messageObj.message
+        """
+        Ask the poller thread for the messages since the last poll.
+        If the last poll is still running, this one is skipped
+        """
+        if self.is_polling:
+            return
+        self.is_polling = True
+        self.poller.poll_requested.emit()
 
-            self.status.append(self.get_status_from_type(messageObj.message_type))
+    @Slot()
+    def end_poll(self):
+        self.is_polling = False
 
-            self.insertRows(lst, index, 1)
-            self.lastLiveIndex += 1
+    @Slot(object)
+    def add_live_rows(self, newMessages):
+        """
+        Add a polled batch of newest first messages to the top of the table, then evict the oldest rows.
+        The table shows liveMessages, so this also adds them there.
+        Always runs on the GUI thread.
+        """
+        self.is_polling = False
+        self.prepend_rows(newMessages)
+        self.evict_live()
 
-    def update_interactive(self, start, end):
-        self.removeRows(0, self.rowCount())
+    def reload_live(self):
+        """
+        Ask the poller thread for all the live messages again, after the enabled message types changed.
+        It runs after any poll already waiting, so the rows it sends are never older than the table's.
+        """
+        self.poller.reload_requested.emit()
 
-        self.message_model.update_interval_messages(start, end)
+    @Slot(object)
+    def set_live_rows(self, messages):
+        """Show a reloaded set of live messages in place of the current ones. Always runs on the GUI thread."""
+        self.beginResetModel()
+        self.message_model.replace_live_messages(messages)
+        self.endResetModel()
+        self.evict_live()
 
-        interactiveMessages = self.message_model.interactiveMessages
-        for index, messageObj in enumerate(interactiveMessages):
-            lst = [messageObj.message] * len(self.hdr_lst)
-            lst[0] = datetime.fromtimestamp(messageObj.seconds_from_1990
-                                            + FROM_1970_TO_1990_IN_SECONDS)
-            lst[1] = messageObj.message
+    def stop_worker(self):
+        """Stop the worker thread before the application exits."""
+        self.search_generation += 1  # lets a running search stop at its next chunk
+        self.worker_thread.quit()
+        self.worker_thread.wait()
 
-            self.status.append(self.get_status_from_type(messageObj.message_type))
+    def evict_live(self):
+        """
+        Drop the rows of the live messages that the message model let go of
+        They are always the oldest, at the bottom of the table, so it is one removal
+        """
+        evicted = self.message_model.count_old_live_messages()
+        if evicted:
+            self.removeRows(len(self._data) - evicted, evicted)
+
+    def update_interactive(self, start, end, search_text=''):
+        """
+        Clear the table and start a search from start to end on the search thread,
+        only keeping the messages that match search_text.
+        A search that is still running is cancelled first.
+        """
+        if self.searcher is None:
+            self.searcher = IntervalSearchWorker(self)
+            self.searcher.chunk_loaded.connect(self.add_interactive_rows, Qt.QueuedConnection)
+            self.searcher.search_finished.connect(self.end_search, Qt.QueuedConnection)
+            self.start_worker(self.searcher)
+
+        self.search_generation += 1
+        self.is_searching = True
+        self.search_total = end - start
+        self.message_model.keep_cached_from(start)
+
+        self.beginResetModel()
+        self.message_model.clear_interactive_messages()
+        self._data = self.message_model.interactiveMessages
+        self.endResetModel()
+
+        self.search_progress.emit(0, self.search_total)
+        self.searcher.search_requested.emit(self.search_generation, start, end, search_text)
+
+    def cancel_interactive(self):
+        """Stop the running search after its current chunk, keeping the rows already shown"""
+        if self.is_searching:
+            self.search_generation += 1
+            self.is_searching = False
+            self.search_done.emit()
+
+    @Slot(int, object, int)
+    def add_interactive_rows(self, generation, messages, covered):
+        """
+        Add a chunk of search messages to the bottom of the table, they are older than every row shown.
+        The table shows interactiveMessages, so this also adds them there.
+        Always runs on the GUI thread.
+        """
+        if generation != self.search_generation:
+            return
+        self.append_rows(messages)
+        self.search_progress.emit(covered, self.search_total)
 
-            self.insertRows(lst, -1, 1)
+    @Slot(int)
+    def end_search(self, generation):
+        if generation == self.search_generation and self.is_searching:
+            self.is_searching = False
+            self.search_done.emit()
 
     def get_status_from_type(self, message_type):
         status = Statuses.BGD
@@ -154,7 +355,7 @@ class MessageTableModel(QAbstractTableModel):
         """Called by MPSSortFilterProxyModel to filter out rows based on
         the table's needs."""
         for col, text in filters.items():
-            if text not in str(self._data[row][col]).lower():
+            if text not in self.display_text(row, col).lower():
                 return False
         return True
 
@@ -0,0 +1,137 @@
+from logging import getLogger
+from epics import ca
+from qtpy.QtCore import Qt, QObject, Signal, Slot
+from models.all_logic_model import AllLogicModel
+from models.all_faults_model import ALLFaultsModel
+from models.all_messages_model import AllMessagesModel
+from dbinteraction.historyDB.history_backend import SQLiteHistoryBackend
+from dbinteraction.version_diff import VersionDigest, model_digest, read_digest
+from mps_constants import PV_CONNECTION_TIMEOUT
+
+
+class ModelLoader(QObject):
+    """
+    author: Evren Keskin
+    ===================================================================
+    A worker that lives on its own QThread and builds the display's models.
+    It waits for the version PVs, loads the config and logic databases of those versions,
+    then the first hours of history, and hands each model to the GUI thread as soon as it is ready,
+    so the window is shown and usable while the rest is still loading.
+    All of the PVs are made by the GUI thread beforehand,
+    so their channel access connections are already under way, all at the same time.
+    When a new config or logic version is deployed, the same thread builds the models of the new version.
+    The content hashes of the new version are compared to the loaded one first,
+    so a version with the same content is never loaded, and the GUI knows which rows changed.
+    A version that fails to load is sent back with reload_failed, so the GUI can try it again later.
+    A failed startup load is sent back with load_failed, and loading again picks up at the model that failed.
+    ===================================================================
+    """
+    logger = getLogger(__name__)
+    load_requested = Signal()
+    logic_loaded = Signal(object, object, object)
+    reload_requested = Signal(object, object)
+    logic_reloaded = Signal(object, object, object, object)
+    reload_failed = Signal(object, object)
+    messages_loaded = Signal(object)
+    load_failed = Signal(str)
+
+    def __init__(self, accel_type, config_prefix, logic_prefix, version_pvs, wait_pvs,
+                 load_messages=True, history_wallet=None, history_file=None):
+        super(ModelLoader, self).__init__()
+        self.accel_type = accel_type
+        self.config_prefix = config_prefix
+        self.logic_prefix = logic_prefix
+        self.config_pv, self.logic_pv = version_pvs
+        self.wait_pvs = wait_pvs
+        self.load_messages = load_messages
+        self.history_wallet = history_wallet
+        self.history_file = history_file
+        self.versions = None
+        self.filenames = None  # the config and logic files the loaded models opened
+        self.digest = None  # made on the first reload, the version files never change
+        self.load_requested.connect(self.load, Qt.QueuedConnection)
+        self.reload_requested.connect(self.reload, Qt.QueuedConnection)
+
+    @Slot()
+    def load(self):
+        """
+        Load the logic model of the current versions, then the history messages model.
+        After a failure it can be run again, the logic model is only loaded until it succeeds once.
+        """
+        # Channel access calls from a thread other than the main one need the main CA context
+        ca.use_initial_context()
+        if self.versions is None:
+            config_version = logic_version = None
+            try:
+                config_version = self.config_pv.get(timeout=PV_CONNECTION_TIMEOUT)
+                logic_version = self.logic_pv.get(timeout=PV_CONNECTION_TIMEOUT)
+                if config_version is None or logic_version is None:
+                    raise RuntimeError('config or logic version PV did not connect')
+
+                logic_model = self.load_logic_model(config_version, logic_version)
+                # The table models read these as soon as they are made, so they must be connected first
+                for pv in self.wait_pvs:
+                    pv.wait_for_connection(timeout=PV_CONNECTION_TIMEOUT)
+            except Exception as e:
+                self.logger.exception('Loading the config and logic models failed')
+                failure = f'Loading the config and logic models failed: {e}'
+                if config_version is not None and logic_version is not None:
+                    failure += '\n' + '\n'.join(self.version_filenames(config_version, logic_version))
+                self.load_failed.emit(failure)
+                return
+            self.versions = (config_version, logic_version)
+            self.filenames = (logic_model.configDB.filename, logic_model.filename)
+            self.logic_loaded.emit(logic_model, config_version, logic_version)
+
+        if not self.load_messages:
+            return
+        try:
+            if self.history_file:
+                messages_model = AllMessagesModel(backend=SQLiteHistoryBackend(self.history_file))
+            else:
+                messages_model = AllMessagesModel(wallet=self.history_wallet)
+        except Exception as e:
+            self.logger.exception('Loading the history messages model failed')
+            self.load_failed.emit(f'Loading the history messages model failed: {e}')
+            return
+        self.messages_loaded.emit(messages_model)
+
+    @Slot(object, object)
+    def reload(self, config_version, logic_version):
+        """
+        Diff a newly deployed config and logic version against the loaded one,
+        and build its logic model unless the content is the same.
+        The model is None for a version with the same content,
+        unless the version's files are missing and it had to be built to find out.
+        """
+        try:
+            if self.digest is None:
+                self.digest = VersionDigest(*self.filenames)
+            digest = read_digest(*self.version_filenames(config_version, logic_version))
+            if digest is None:
+                # Without the versioned files the models load the default database, so diff the files they opened
+                logic_model = self.load_logic_model(config_version, logic_version)
+                digest = model_digest(logic_model)
+                diff = digest.diff(self.digest)
+            else:
+                diff = digest.diff(self.digest)
+                logic_model = None if diff.is_empty() else self.load_logic_model(config_version, logic_version)
+        except Exception:
+            self.logger.exception(f'Loading config version {config_version} and logic version {logic_version} failed')
+            self.reload_failed.emit(config_version, logic_version)
+            return
+        self.logger.info(f'Config version {config_version} and logic version {logic_version}: {diff.summary()}')
+        self.versions = (config_version, logic_version)
+        self.digest = digest
+        self.logic_reloaded.emit(logic_model, config_version, logic_version, diff)
+
+    def version_filenames(self, config_version, logic_version):
+        """The config and logic database files of a config and logic version"""
+        return (f'{self.config_prefix}/{config_version}/mpsdb.sqlite3',
+                f'{self.logic_prefix}/{logic_version}/build/mpslogic.sqlite')
+
+    def load_logic_model(self, config_version, logic_version):
+        """Build the faults and logic models from the database files of a config and logic version"""
+        configFilename, logicFilename = self.version_filenames(config_version, logic_version)
+        myConfigDB = ALLFaultsModel(accel_type=self.accel_type, filename=configFilename)
+        return AllLogicModel(myConfigDB, accel_type=self.accel_type, filename=logicFilename)
@@ -0,0 +1,152 @@
+from datetime import datetime
+from logging import getLogger
+from qtpy.QtCore import Qt, QModelIndex, QAbstractTableModel, QObject, QThread, Signal, Slot
+from qtpy.QtWidgets import QApplication
+from models.all_messages_model import AllMessagesModel
+from mps_constants import FROM_1970_TO_1990_IN_SECONDS
+
+MESSAGE_TYPE_NAMES = {'BD': 'Beam Destination', 'BR': 'Beam Rate', 'BT': 'Bypass Time',
+                      'BV': 'Bypass Value', 'F': 'Fault'}
+"""The names the overview shows for each message type"""
+
+
+class OverviewLoader(QObject):
+    """
+    author: Evren Keskin
+    ===================================================================
+    A worker that lives on its own QThread and asks the history database for an overview,
+    the message counts of each time bucket, message type and device.
+    Every overview is tagged with the generation of the request it belongs to.
+    ===================================================================
+    """
+    overview_requested = Signal(int, int, int)
+    overview_loaded = Signal(int, list)
+
+    def __init__(self, message_model: AllMessagesModel):
+        super(OverviewLoader, self).__init__()
+        self.message_model = message_model
+        self.overview_requested.connect(self.load, Qt.QueuedConnection)
+
+    @Slot(int, int, int)
+    def load(self, generation, start, end):
+        """Count the messages from start up to end, then send the counts to the table model"""
+        try:
+            overview = self.message_model.get_overview(start, end)
+        except Exception:
+            OverviewTableModel.logger.exception('History overview failed')
+            overview = []
+        self.overview_loaded.emit(generation, overview)
+
+
+class OverviewTableModel(QAbstractTableModel):
+    """
+    author: Evren Keskin
+    ===================================================================
+    This is a table model that holds the history overview for display.
+    Each row is the number of messages of one message type and device in one time bucket,
+    counted by the history database, so a week of history is only a few thousand rows.
+    '_data' holds the rows as (bucket start, bucket end, message type, device name, count).
+    A row is drilled into by searching its bucket for its device in the interactive table.
+    ===================================================================
+    """
+    logger = getLogger(__name__)
+    overview_done = Signal()
+
+    def __init__(self, parent, messages_model: AllMessagesModel):
+        super(OverviewTableModel, self).__init__(parent)
+        self.message_model = messages_model
+
+        self.hdr_lst = (["Date", "Type", "Device", "Messages"])
+
+        self._data = []
+        self.generation = 0
+        self.interval = None  # the (start, end) of the last overview, counted again when the types change
+
+        self.loader_thread = QThread(self)
+        self.loader = OverviewLoader(messages_model)
+        self.loader.moveToThread(self.loader_thread)
+        self.loader.overview_loaded.connect(self.set_overview, Qt.QueuedConnection)
+        self.loader_thread.start()
+        QApplication.instance().aboutToQuit.connect(self.stop_loader)
+
+    def rowCount(self, index: QModelIndex = QModelIndex()):
+        """Return the number of rows in the model."""
+        return 0 if index.isValid() else len(self._data)
+
+    def columnCount(self, index: QModelIndex = QModelIndex()):
+        """Return the number of columns in the model."""
+        return len(self.hdr_lst)
+
+    def display_text(self, row, column):
+        """Make the text of one cell"""
+        bucket_start, bucket_end, message_type, device_name, count = self._data[row]
+        if column == 0:
+            return str(datetime.fromtimestamp(bucket_start + FROM_1970_TO_1990_IN_SECONDS))
+        elif column == 1:
+            return MESSAGE_TYPE_NAMES.get(message_type, message_type)
+        elif column == 2:
+            return device_name or ''
+        return str(count)
+
+    def data(self, index: QModelIndex, role: Qt.ItemDataRole):
+        """Return the index's text or alignment."""
+        if not index.isValid():
+            return
+        elif role == Qt.DisplayRole:
+            if index.column() == 3:
+                return self._data[index.row()][4]  # a number, so the proxy sorts the counts numerically
+            return self.display_text(index.row(), index.column())
+        elif role == Qt.TextAlignmentRole and 0 < index.column():
+            return Qt.AlignCenter
+
+    def headerData(self, section: int, orientation: Qt.Orientation,
+                   role: Qt.ItemDataRole):
+        """Set the horizontal header's text."""
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.hdr_lst[section]
+
+    def update_overview(self, start, end):
+        """Clear the table and count the messages from start up to end on the loader thread."""
+        self.interval = (start, end)
+        self.generation += 1
+        self.beginResetModel()
+        self._data = []
+        self.endResetModel()
+        self.loader.overview_requested.emit(self.generation, start, end)
+
+    def refresh_overview(self):
+        """Count the last overview's time range again, after the enabled message types changed."""
+        if self.interval is not None:
+            self.update_overview(*self.interval)
+
+    @Slot(int, list)
+    def set_overview(self, generation, overview):
+        """Show a finished overview, unless a newer one was asked for since. Always runs on the GUI thread."""
+        if generation != self.generation:
+            return
+        self.beginResetModel()
+        self._data = overview
+        self.endResetModel()
+        self.overview_done.emit()
+
+    def get_bucket(self, row):
+        """The bucket start, bucket end and device name of a row, what drilling into it searches for"""
+        bucket_start, bucket_end, message_type, device_name, count = self._data[row]
+        return bucket_start, bucket_end, device_name or ''
+
+    def message_count(self):
+        """The number of messages counted by the whole overview"""
+        return sum(row[4] for row in self._data)
+
+    def stop_loader(self):
+        """Stop the loader thread before the application exits."""
+        self.loader_thread.quit()
+        self.loader_thread.wait()
+
+    def filter_accepts_row(self, row: int, parent: QModelIndex, filters: dict):
+        """Called by MPSSortFilterProxyModel to filter out rows based on
+        the table's needs."""
+        for col, text in filters.items():
+            if text not in self.display_text(row, col).lower():
+                return False
+        return True
@@ -1,4 +1,34 @@
 
+def beam_dest_text(previousDestination, currentDestination):
+    return f'Beam destination changed from {previousDestination} to {currentDestination}'
+
+
+def beam_rate_text(deviceName, previousRate, newRate):
+    return f'Beam rate after {deviceName} changed from {previousRate} to {newRate}'
+
+
+def bypass_time_text(deviceName, faultName, bypassTimeInSeconds):
+    if bypassTimeInSeconds > 0:
+        suffix = f'is bypassed for {bypassTimeInSeconds} sec'
+    else:
+        suffix = 'bypass has cleared'
+    return f'{deviceName} {faultName} {suffix}'
+
+
+def change_text(deviceName, faultName, oldValue, newValue):
+    return f'{deviceName} {faultName} changed from {oldValue} to {newValue}'
+
+
+MESSAGE_FORMATTERS = {'BD': beam_dest_text, 'BR': beam_rate_text, 'BT': bypass_time_text,
+                      'BV': change_text, 'F': change_text}
+"""The message text of each message type, made from the fields of its history row after the time"""
+
+
+def format_message(message_type, fields):
+    """Make the message text of a message type from its history row fields"""
+    return MESSAGE_FORMATTERS[message_type](*fields)
+
+
 class PreppedMessage():
     """
     author: Evren Keskin
@@ -31,32 +61,27 @@ class PreppedMessage():
 
     def set_beam_dest_message(self, previousDestination, currentDestination, seconds, nanos):
         self.set_time(seconds, nanos)
-        self.message = f'Beam destination changed from {previousDestination} to {currentDestination}'
+        self.message = beam_dest_text(previousDestination, currentDestination)
         self.message_type = 'BD'
 
     def set_beam_rate_message(self, deviceName, previousRate, newRate, seconds, nanos):
         self.set_time(seconds, nanos)
-        self.message = f'Beam rate after {deviceName} changed from {previousRate} to {newRate}'
+        self.message = beam_rate_text(deviceName, previousRate, newRate)
         self.message_type = 'BR'
 
     def set_bypass_time_message(self, deviceName, faultName, bypassTimeInSeconds, seconds, nanos):
         self.set_time(seconds, nanos)
-        suffix = None
-        if bypassTimeInSeconds > 0:
-            suffix = f'is bypassed for {bypassTimeInSeconds} sec'
-        else:
-            suffix = 'bypass has cleared'
-        self.message = f'{deviceName} {faultName} {suffix}'
+        self.message = bypass_time_text(deviceName, faultName, bypassTimeInSeconds)
         self.message_type = 'BT'
 
     def set_bypass_value_message(self, deviceName, faultName, oldValue, newValue, seconds, nanos):
         self.set_time(seconds, nanos)
-        self.message = f'{deviceName} {faultName} changed from {oldValue} to {newValue}'
+        self.message = change_text(deviceName, faultName, oldValue, newValue)
         self.message_type = 'BV'
 
     def set_fault_message(self, deviceName, faultName, oldState, newState, seconds, nanos):
         self.set_time(seconds, nanos)
-        self.message = f'{deviceName} {faultName} changed from {oldState} to {newState}'
+        self.message = change_text(deviceName, faultName, oldState, newState)
         self.message_type = 'F'
 
     # Not sure which one of these is used for sort comparisons
@@ -1,16 +1,172 @@
-import time
-import threading
 from logging import getLogger
 from platform import system
-from qtpy.QtCore import (Qt, QModelIndex, QAbstractTableModel,
-                         QEvent, QSortFilterProxyModel)
+from qtpy.QtCore import (Qt, QModelIndex, QAbstractTableModel, QObject, QThread, QTimer,
+                         QEvent, QSortFilterProxyModel, Signal, Slot)
 from qtpy.QtWidgets import (QStyledItemDelegate, QApplication, QToolTip)
 from .enums import Statuses
 from models.all_logic_model import AllLogicModel
 from models.prepped_macro_state import PreppedMacroState
-from mps_constants import RECENT_FAULTS_MAX
+from mps_constants import RECENT_FAULTS_MAX, RECENT_FAULTS_PAGE_SIZE, RECENT_FAULTS_LOADED_MAX
 from dbinteraction.mps_config import MPSConfig
-from dbinteraction.recentStatesDB.recent_sql import do_select
+from dbinteraction.recentStatesDB.recent_sql import do_select_page, do_select_count, search_condition
+
+
+class RecentStatesLoader(QObject):
+    """
+    author: Evren Keskin
+    ===================================================================
+    A worker that lives on its own QThread and reads the recent states DB.
+    It runs the SQLite queries and decodes the rows into table rows,
+    then hands the finished batches back to the GUI thread.
+    Rows are read a page at a time, keyed on the row id, so only the pages
+    the table actually shows are ever read into memory.
+    A search on the macro name is done in the DB as part of the same page reads,
+    every batch is tagged with the generation of the search it belongs to.
+    ===================================================================
+    """
+    newer_requested = Signal(int)
+    older_requested = Signal(int)
+    search_requested = Signal(int, str)
+    newer_loaded = Signal(int, list, list, list, int)
+    older_loaded = Signal(int, list, list, list, bool)
+
+    def __init__(self, model: AllLogicModel, config: MPSConfig, accel_type, column_count, numind):
+        super(RecentStatesLoader, self).__init__()
+        self.model = model
+        self.config = config
+        self.accel_type = accel_type
+        self.column_count = column_count
+        self.numind = numind
+
+        self.newest_id = None
+        self.newer_timer = None
+        self.generation = 0
+        self.search_text = ''
+        self.total = 0
+
+        self.newer_requested.connect(self.schedule_newer, Qt.QueuedConnection)
+        self.older_requested.connect(self.load_older, Qt.QueuedConnection)
+        self.search_requested.connect(self.start_search, Qt.QueuedConnection)
+
+    def request_newer(self, delay=0):
+        """
+        Ask for rows newer than the ones already loaded, safe to call from any thread.
+        Requests made while one is already waiting are merged into that one.
+        """
+        self.newer_requested.emit(delay)
+
+    def request_older(self, before_id):
+        """
+        Ask for the page of rows older than before_id, safe to call from any thread.
+        """
+        self.older_requested.emit(before_id)
+
+    def request_search(self, generation, search_text):
+        """
+        Ask for the newest page of rows matching search_text, safe to call from any thread.
+        """
+        self.search_requested.emit(generation, search_text)
+
+    @Slot(int, str)
+    def start_search(self, generation, search_text):
+        """Start over from the newest page, only reading rows that match the new search."""
+        self.generation = generation
+        self.search_text = search_text
+        self.newest_id = None
+        if self.newer_timer is not None:
+            self.newer_timer.stop()
+        self.load_newer()
+
+    @Slot(int)
+    def schedule_newer(self, delay):
+        """Start the wait before reading newer rows, unless one is already waiting."""
+        if self.newer_timer is None:
+            self.newer_timer = QTimer(self)
+            self.newer_timer.setSingleShot(True)
+            self.newer_timer.timeout.connect(self.load_newer)
+        if not self.newer_timer.isActive():
+            self.newer_timer.start(delay)
+
+    @Slot()
+    def load_newer(self):
+        """
+        Read and decode the rows newer than the newest one loaded, then send them to the table model.
+        The first load reads just the newest page, and counts the rows.
+        Later loads add the new rows to that count instead of counting every matching row again.
+        """
+        with self.config.Session() as session:
+            condition = self.search(session)
+            if self.newest_id is None:
+                state_messages = do_select_page(session, limit=RECENT_FAULTS_PAGE_SIZE, condition=condition)
+                self.total = do_select_count(session, condition=condition)
+            else:
+                state_messages = do_select_page(session, after_id=self.newest_id, condition=condition)
+                # The daemon drops the oldest rows past RECENT_FAULTS_MAX, so there are never more than that
+                self.total = min(self.total + len(state_messages), RECENT_FAULTS_MAX)
+
+        if state_messages:
+            self.newest_id = state_messages[0][0]
+
+        rows, channels, ids = self.build_rows(state_messages)
+        self.newer_loaded.emit(self.generation, rows, channels, ids, self.total)
+
+    @Slot(int)
+    def load_older(self, before_id):
+        """
+        Read and decode the page of rows older than before_id, then send them to the table model.
+        """
+        with self.config.Session() as session:
+            state_messages = do_select_page(session, before_id=before_id, limit=RECENT_FAULTS_PAGE_SIZE,
+                                            condition=self.search(session))
+
+        rows, channels, ids = self.build_rows(state_messages)
+        self.older_loaded.emit(self.generation, rows, channels, ids, len(state_messages) == RECENT_FAULTS_PAGE_SIZE)
+
+    def search(self, session):
+        """The condition of the current search, looked up once per load, or None without a search"""
+        if not self.search_text:
+            return None
+        return search_condition(session, self.search_text)
+
+    def build_rows(self, state_messages):
+        """
+        Decode a newest first list of recent states into table rows, channels and row ids
+        """
+        names_to_numbers = {}
+        if self.model is not None:
+            names_to_numbers = {macro.macro_name: num for num, macro in self.model.numbersToPreppedDevices.items()}
+
+        rows = [self.build_row(recent_state, names_to_numbers) for recent_state in state_messages]
+        channels = [recent_state[2] for recent_state in state_messages]
+        ids = [recent_state[0] for recent_state in state_messages]
+        return rows, channels, ids
+
+    def build_row(self, recent_state, names_to_numbers):
+        """
+        Populate a recent fault row with the
+        date, macro name, state name, and state rates info.
+        """
+        date = recent_state[1]
+        macro_name = recent_state[2]
+        state_name = recent_state[3]
+        min_rate = recent_state[4]
+        state_rates = recent_state[5:]
+
+        lst = [date] * self.column_count
+        lst[0] = date
+        lst[1] = macro_name
+        lst[2] = state_name
+        lst[3] = min_rate
+        if self.accel_type == 'LCLS':
+            for index, rate in enumerate(state_rates):
+                lst[index + 4] = rate
+        else:  # FACET
+            lst[4] = state_rates[0]
+            lst[5] = state_rates[2]
+            lst[6] = state_rates[1]
+
+        lst[self.numind] = names_to_numbers.get(macro_name, -1)
+        return lst
 
 
 class RecentTableModel(QAbstractTableModel):
@@ -20,12 +176,13 @@ class RecentTableModel(QAbstractTableModel):
     This is a table model about the recent states of macros.
     It shows a date of a latest state change, along with the macro and what that state is.
     It is only as accurate as the current state PV is accurate.
-    The recent states are grabbed by reading a JSON file which is written to by a daemon.
-    The JSON represents a recent state by date, macro number, and state number.
-    This table reconstructs that into the full information the user needs to see.
-    The daemon and this program regularly exchange locks on this file
-    this for reading, and the daemon for writing.
-    This is mainly so that the JSON will be up to date without the GUI.
+    The recent states are grabbed by reading a SQLite DB which is written to by a daemon.
+    The reading and decoding is done by a RecentStatesLoader on its own thread,
+    and the finished rows are added to this table on the GUI thread.
+    Older rows are paged in with canFetchMore/fetchMore as the user scrolls down.
+    The logic model is only used to find the macro number of each row,
+    it is None for the recent faults CUD, which never looks a macro up.
+    This is mainly so that the DB will be up to date without the GUI.
     ===================================================================
     """
     logger = getLogger(__name__)
@@ -42,15 +199,34 @@ class RecentTableModel(QAbstractTableModel):
 
         self.numind = self.hdr_lst.index('Macro Number')
 
-        # table data, which will hold inputs from database data
-        self._data = [['not an item', 'DATABASE ERROR', 'no state', '--',
-                       '--', '--', '--', '--', '--', '--', '--', '--', -1]] * RECENT_FAULTS_MAX
+        # table data, which will hold inputs from database data, newest first
+        # only the pages that have been scrolled to are loaded
+        self._data = []
+        self.ids = []  # the recent state DB id of each row, used as the key for paging
+        self.total_count = 0
+        self.has_older = False  # only known once the newest page has been read
+        self.is_fetching_older = False
+        self.requested_before_id = None
+        self.generation = 0  # bumped on every new search, so batches from an old search are dropped
 
         self.accel_type = accel_type
         self.channels = []  # channels used to copy the name of the logic item easily with middle click
 
         self.config = MPSConfig(recent_faults_filename)
 
+        # The SQLite reads happen on a separate thread, so neither the PV callback thread
+        # nor the GUI thread ever waits on the recent states DB
+        self.loader_thread = QThread(self)
+        self.loader = RecentStatesLoader(model, self.config, accel_type, len(self.hdr_lst), self.numind)
+        self.loader.moveToThread(self.loader_thread)
+        self.loader.newer_loaded.connect(self.add_newer_rows, Qt.QueuedConnection)
+        self.loader.older_loaded.connect(self.add_older_rows, Qt.QueuedConnection)
+        self.loader_thread.start()
+        QApplication.instance().aboutToQuit.connect(self.stop_loader)
+
+        # The newest page is shown right away, older pages are read as the user scrolls
+        self.loader.request_newer()
+
     def rowCount(self, index: QModelIndex = QModelIndex()):
         """Return the number of rows in the model."""
         return len(self._data)
@@ -78,7 +254,7 @@ class RecentTableModel(QAbstractTableModel):
                 return Statuses.RED.brush()
 
             elif (2 < col) and (txt == '1 Hz' or txt == '10 Hz' or txt == '30 Hz' or txt == '60 Hz'):
-                if self.model.linactype == 'LCLS':
+                if self.accel_type == 'LCLS':
                     return Statuses.YEL.brush()
                 elif txt == '30 Hz':  # FACET
                     return Statuses.GRN.brush()
@@ -101,65 +277,107 @@ class RecentTableModel(QAbstractTableModel):
 
     def set_data(self):
         """
-        Set initial data for each row, based on a recent state.
-        Populate each recent fault item with the
-        date, macro name, state name, and state rates info.
+        Ask the loader thread to read the recent states added since the last read.
+        This is safe to call from the PV callback thread,
+        the table itself is only changed once the rows come back in add_newer_rows.
         """
         # Problem to improve upon
         # The daemon AND this table both try to change data when current state PV changes
         # IF the daemon writes new changes to sqlite db in time, this is fine
         # BUT!!! this program has no idea if its pulling in new changes or not
         # Easy, but odd fix: have a long time(5 seconds) to pull in recent fault changes
-        # Probably very annoying for control operators. Lol.
-        time.sleep(5)  # Give the daemon additional time to go first
-        state_messages = self.get_sqlite_recent_states()
+        # This only holds up the loader thread, never the GUI
+        self.loader.request_newer(5000)  # Give the daemon additional time to go first
 
-        self._data = []
+    def set_logic_model(self, model: AllLogicModel):
+        """
+        Use the logic model of a new config and logic version to find the macro numbers,
+        of the rows read from then on
+        """
+        self.model = model
+        self.loader.model = model
 
-        self.channels = []
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()):
+        """Tell the view if there are older recent states left to page in."""
+        return not parent.isValid() and self.has_older and not self.is_fetching_older
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()):
+        """Ask the loader thread for the next page of older recent states."""
+        if not self.canFetchMore(parent):
+            return
+        self.is_fetching_older = True
+        self.requested_before_id = self.ids[-1]
+        self.loader.request_older(self.requested_before_id)
 
-        for recent_state in state_messages:
-            date = recent_state[1]
-            macro_name = recent_state[2]
-            state_name = recent_state[3]
-            min_rate = recent_state[4]
-            state_rates = recent_state[5:]
-
-            lst = [date] * len(self.hdr_lst)
-            lst[0] = date
-            lst[1] = macro_name
-            lst[2] = state_name
-            lst[3] = min_rate
-            if self.accel_type == 'LCLS':
-                for index, rate in enumerate(state_rates):
-                    lst[index + 4] = rate
-            else:  # FACET
-                lst[4] = state_rates[0]
-                lst[5] = state_rates[2]
-                lst[6] = state_rates[1]
-
-            macro_num = -1
-            for num in self.model.numbersToPreppedDevices:
-                if macro_name == self.model.numbersToPreppedDevices[num].macro_name:
-                    macro_num = num
-                    break
-            lst[self.numind] = macro_num
-
-            self._data.insert(0, lst)
-
-            self.dataChanged.emit(self.index(0, 1),
-                                  self.index(0, len(self.hdr_lst) - 1))
-
-            self.channels.insert(0, macro_name)
-
-    def get_sqlite_recent_states(self):
-
-        lock = threading.Lock()
-        with lock:
-            with self.config.Session() as session:
-                recent_states_list = do_select(session)
-
-        return recent_states_list
+    def set_search_text(self, search_text):
+        """
+        Show only the recent states whose macro name contains search_text.
+        The search runs in the recent states DB, so it covers every retained row
+        and not just the pages that happen to be loaded.
+        """
+        self.generation += 1
+        self.beginResetModel()
+        self._data = []
+        self.channels = []
+        self.ids = []
+        self.has_older = False
+        self.is_fetching_older = False
+        self.endResetModel()
+        self.loader.request_search(self.generation, search_text)
+
+    @Slot(int, list, list, list, int)
+    def add_newer_rows(self, generation, rows, channels, ids, total):
+        """
+        Put a batch of rows newer than everything loaded at the top of the table.
+        Always runs on the GUI thread.
+        """
+        if generation != self.generation:
+            return
+        self.total_count = total
+        if not self._data:
+            # The first rows read are only the newest page, anything past it is left for paging
+            self.has_older = len(rows) == RECENT_FAULTS_PAGE_SIZE
+        if rows:
+            self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+            self._data[:0] = rows
+            self.channels[:0] = channels
+            self.ids[:0] = ids
+            self.endInsertRows()
+
+        # Keep memory flat for long sessions, the dropped pages can be paged back in by scrolling
+        if len(self._data) > RECENT_FAULTS_LOADED_MAX:
+            self.beginRemoveRows(QModelIndex(), RECENT_FAULTS_LOADED_MAX, len(self._data) - 1)
+            del self._data[RECENT_FAULTS_LOADED_MAX:]
+            del self.channels[RECENT_FAULTS_LOADED_MAX:]
+            del self.ids[RECENT_FAULTS_LOADED_MAX:]
+            self.endRemoveRows()
+            self.has_older = True
+
+    @Slot(int, list, list, list, bool)
+    def add_older_rows(self, generation, rows, channels, ids, has_older):
+        """
+        Put a page of rows older than everything loaded at the bottom of the table.
+        Always runs on the GUI thread.
+        """
+        if generation != self.generation:
+            return
+        self.is_fetching_older = False
+        if not self.ids or self.ids[-1] != self.requested_before_id:
+            # The bottom of the table was dropped while this page was being read
+            return
+        self.has_older = has_older
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self._data), len(self._data) + len(rows) - 1)
+            self._data += rows
+            self.channels += channels
+            self.ids += ids
+            self.endInsertRows()
+
+    @Slot()
+    def stop_loader(self):
+        """Stop the loader thread before the application exits."""
+        self.loader_thread.quit()
+        self.loader_thread.wait()
 
     def less_than(self, left: QModelIndex, right: QModelIndex, sortorder: Qt.SortOrder):
         """Called by MPSSortFilterProxyModel to sort rows based on the
@@ -1,5 +1,47 @@
-RECENT_FAULTS_MAX = 1000
+RECENT_FAULTS_MAX = 1000000
 """Amount of recent faults to record"""
+RECENT_FAULTS_PAGE_SIZE = 500
+"""Amount of recent faults read from the DB at a time for the recent faults table"""
+RECENT_FAULTS_LOADED_MAX = 20 * RECENT_FAULTS_PAGE_SIZE
+"""Amount of recent faults the table keeps loaded before dropping the oldest pages"""
+RECENT_SEARCH_NAMES_MAX = 500
+"""Most matching macro names a recent faults search looks up through the macro name index"""
+RECENT_ARCHIVE_DAYS = 90
+"""Amount of days of daily recent state archive files the daemon keeps"""
+HISTORY_QUERY_THREADS = 5
+"""Most history queries that run against the history DB at the same time"""
+LIVE_MESSAGES_MAX = 50000
+"""Most messages the live history view keeps, the oldest ones are dropped past this"""
+LIVE_MESSAGES_MAX_AGE_SECONDS = 3600 * 24
+"""Oldest a message in the live history view can get before it is dropped"""
+HISTORY_SEARCH_CHUNK_SECONDS = 3600
+"""Length of the time chunks an interactive history search is fetched and shown in"""
+HISTORY_CACHE_SETTLE_SECONDS = 60
+"""Newest seconds of history that may still be written, so the local history cache never counts them as complete"""
+HISTORY_OVERVIEW_BUCKET_SECONDS = 3600
+"""Length of the time buckets the history overview counts messages in"""
+HISTORY_DEFAULT_MESSAGE_TYPES = ('BR', 'BT', 'BV', 'F')
+"""Message types the history tabs fetch at startup, beam destination messages are unused since 2009"""
+SEARCH_DEBOUNCE_MS = 300
+"""Milliseconds to wait after the last keystroke before running a search"""
+RECENT_FAULTS_UPDATE_INTERVAL = 1.0
+"""Fewest seconds between recent faults table updates caused by current state changes"""
+CURRENT_STATES_MAX_RATE = 10
+"""Most times a second the console's logic tables show new current states"""
+CURRENT_STATES_MAX_RATE_CUD = 2
+"""Most times a second a CUD's logic tables show new current states"""
+PV_CONNECTION_TIMEOUT = 10.0
+"""Seconds the display waits in the background for a PV it needs to load its models"""
+VERSION_RELOAD_DELAY_MS = 2000
+"""Milliseconds to wait after the last config or logic version change before loading the new version"""
+MODEL_LOAD_RETRY_MS = 30000
+"""Milliseconds to wait before loading the display's models again after the startup load failed"""
+VERSION_RELOAD_RETRY_MS = 30000
+"""Milliseconds to wait before loading a new config or logic version again after it failed to load"""
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+"""Bytes of a read only config or logic database file SQLite reads through memory mapped I/O"""
+SQLITE_CACHE_SIZE_KB = 64 * 1024
+"""Kibibytes of page cache of each read only config or logic database connection"""
 # Number of secs until 01/01/1990 00:00:00 from
 # http://www.onlineconversion.com/unix_time.htm
 FROM_1970_TO_1990_IN_SECONDS = 631152000
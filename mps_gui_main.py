@@ -1,8 +1,8 @@
 from logging import getLogger
 from pydm import Display
-from models.all_logic_model import AllLogicModel
-from models.all_faults_model import ALLFaultsModel
-from models.all_messages_model import AllMessagesModel
+from qtpy.QtCore import Qt, QThread, QTimer, QItemSelection, Slot
+from qtpy.QtWidgets import QApplication, QMessageBox
+from models.model_loader import ModelLoader
 from models.logic_table_model import LogicTableModel, MPSItemDelegate
 from ui.summary import SummaryUI
 from ui.fault import FaultsUI
@@ -10,9 +10,16 @@ from ui.logic import LogicUI
 from ui.ignore import IgnoreUI
 from ui.history import HistoryUI
 from ui.recent_faults import RecentFaultsUI
-from epics import PV
-import time
-from mps_constants import CURRENT_STATES_POSTFIX, CONFIG_VERSION_POSTFIX, LOGIC_VERSION_POSTFIX
+from pv_subscriptions import PVSubscriptionManager, LatestValueMailbox
+from mps_constants import (CURRENT_STATES_POSTFIX, CONFIG_VERSION_POSTFIX, LOGIC_VERSION_POSTFIX,
+                           BYPASS_SECONDS_POSTFIX, BYPASS_FAULT_NUMBERS_POSTFIX,
+                           CURRENT_STATES_MAX_RATE, CURRENT_STATES_MAX_RATE_CUD, VERSION_RELOAD_DELAY_MS,
+                           VERSION_RELOAD_RETRY_MS, MODEL_LOAD_RETRY_MS)
+
+LOGIC_TABS = ('Faults', 'Logic', 'Ignore_Logic', 'Recent_Faults')
+"""The main tabs that show the config and logic models, the summary tab is usable before they load"""
+HISTORY_TABS = ('History',)
+"""The main tabs that show the history messages model"""
 
 
 class MpsGuiDisplay(Display, SummaryUI, FaultsUI, LogicUI, IgnoreUI, HistoryUI, RecentFaultsUI):
@@ -23,14 +30,18 @@ class MpsGuiDisplay(Display, SummaryUI, FaultsUI, LogicUI, IgnoreUI, HistoryUI,
     Gets initialized with various parameters:
     1) the database file paths for configDB
     2) LogicDB path
-    3) HistoryDB path
+    3) HistoryDB path, Oracle unless a local history SQLite file is given
     4) Recent states DB path
     4) Whether or not to run in CUD mode
     5) Choosing LCLS or FACET
     6) IOC_PREFIX (different between LCLS and FACET)
 
     Inherits all UI files, and allows control over all 6 tabs of the UI
-    Alternatively, ignores this for a simpler CUD Run of 1 of 2 screens
+    Alternatively, ignores this for a simpler CUD Run of 1 of 2 screens,
+    which only makes the models and subscriptions its screen shows
+
+    When a new config or logic version is deployed, the models of the new version are built
+    in the background and swapped into every table, without restarting the display
     ===================================================================
     """
     def __init__(self, parent=None, args=[], macros=None, ui_filename=None):
@@ -59,6 +70,8 @@ class MpsGuiDisplay(Display, SummaryUI, FaultsUI, LogicUI, IgnoreUI, HistoryUI,
         super(MpsGuiDisplay, self).__init__(parent=parent, args=args,
                                             macros=macros, ui_filename=ui_filename)
         self.logger = getLogger(__name__)
+        # Every part of the display shares one PV per channel through this
+        self.subscriptions = PVSubscriptionManager.instance()
 
         if (macros is not None and
                 'configDB_Prefix' in macros and
@@ -66,73 +79,178 @@ class MpsGuiDisplay(Display, SummaryUI, FaultsUI, LogicUI, IgnoreUI, HistoryUI,
                 'IOC_PREFIX' in macros and
                 'RECENT_DB_FILE' in macros and
                 'accel_type' in macros):
-            configPrefix = macros['configDB_Prefix']
-            logicPrefix = macros['logicDB_Prefix']
-
-            self.getConfigModel(macros['IOC_PREFIX'])
-            self.getLogicVersion(macros['IOC_PREFIX'])
-
-            configFilename = f'{configPrefix}/{self.config_version}/mpsdb.sqlite3'
-            logicFilename = f'{logicPrefix}/{self.logic_version}/build/mpslogic.sqlite'
+            self.cud_mode = cud_mode
+            self.ioc_prefix = macros['IOC_PREFIX']
+            self.recentStatesDBPath = macros['RECENT_DB_FILE']
 
             if macros['accel_type'] == 'LCLS':
                 self.setupLCLS()
             else:
                 self.setupFACET()
 
-            myConfigDB = ALLFaultsModel(accel_type=self.linactype, filename=configFilename)
-            myLogicDB = AllLogicModel(myConfigDB, accel_type=self.linactype, filename=logicFilename)
-            messageModel = AllMessagesModel(wallet=self.historyWalletKey)
+            self.model = None
+            self.messageModel = None
+            self.logic_tbl_model = None
 
-            self.model = myLogicDB
-            self.messageModel = messageModel
-            self.recentStatesDBPath = macros['RECENT_DB_FILE']
+            if self.cud_mode == 'recent':
+                # The recent faults CUD only reads the recent states DB and watches the current states,
+                # so none of the config, logic or history models are made for it
+                self.recent_faults_init(rates_list=self.rateList, is_cud=True, accel_type=self.linactype)
+                self.recent_faults_connections(IOC_PREFIX=self.ioc_prefix, is_cud=True)
+                return
 
-            # Initialize all screens first
+            # Start every channel access connection the display needs right away, all at once,
+            # the loader thread is the only one that waits for them
+            version_pvs = (self.subscriptions.get_pv(self.ioc_prefix + CONFIG_VERSION_POSTFIX),
+                           self.subscriptions.get_pv(self.ioc_prefix + LOGIC_VERSION_POSTFIX))
+            wait_pvs = [self.subscriptions.get_pv(self.ioc_prefix + postfix)
+                        for postfix in (BYPASS_SECONDS_POSTFIX, BYPASS_FAULT_NUMBERS_POSTFIX, CURRENT_STATES_POSTFIX)]
 
-            self.logic_tbl_model = LogicTableModel(self, self.model, self.linactype,
-                                                   self.rateList, IOC_PREFIX=macros['IOC_PREFIX'])
-            self.delegate = MPSItemDelegate(self)
+            # The window is shown at once, each tab is enabled once the models it shows are loaded
+            if self.is_full_display():
+                self.set_tabs_enabled(LOGIC_TABS, False)
+                self.set_tabs_enabled(HISTORY_TABS, False)
 
-            if cud_mode == 'summary':
-                self.summary_init(is_cud=True)
-            elif cud_mode == 'recent':
-                self.recent_faults_init(rates_list=self.rateList, is_cud=True, accel_type=self.linactype)
-            else:
-                self.summary_init(is_cud=False)
-                self.logic_init(self.rateList, macros['IOC_PREFIX'])
-                self.fault_init()
-                self.ignore_init(self.rateList, macros['IOC_PREFIX'])
-                self.history_init()
-                self.recent_faults_init(rates_list=self.rateList, is_cud=False, accel_type=self.linactype)
-
-            if cud_mode != 'recent':
-                PV(macros['IOC_PREFIX'] + CURRENT_STATES_POSTFIX, callback=self.update_current_states)
-
-            # Then connect them to PV's or other connections
-            if cud_mode != 'summary' and cud_mode != 'recent':
-                # logic connections requires a PV callback connection setup, which can take some time
-                # but a 1 second wait should be a good clear for that time
-                time.sleep(1.0)
-
-                self.logic_connections(IOC_PREFIX=macros['IOC_PREFIX'])
-                self.fault_connections()
-                self.summ_connections(is_cud=False)
-                self.ignore_connections()
-                self.history_connections()
-                self.recent_faults_connections(IOC_PREFIX=macros['IOC_PREFIX'], is_cud=False)
-            if cud_mode == 'recent':
-                self.recent_faults_connections(IOC_PREFIX=macros['IOC_PREFIX'], is_cud=True)
-            if cud_mode == 'summary':
-                self.summ_connections(is_cud=True)
+            self.loader_thread = QThread(self)
+            self.loader = ModelLoader(self.linactype, macros['configDB_Prefix'], macros['logicDB_Prefix'],
+                                      version_pvs, wait_pvs, load_messages=self.is_full_display(),
+                                      history_wallet=self.historyWalletKey,
+                                      history_file=macros.get('HISTORY_DB_FILE'))
+            self.loader.moveToThread(self.loader_thread)
+            self.loader.logic_loaded.connect(self.finish_logic_startup, Qt.QueuedConnection)
+            self.loader.logic_reloaded.connect(self.swap_logic_model, Qt.QueuedConnection)
+            self.loader.reload_failed.connect(self.retry_reload, Qt.QueuedConnection)
+            self.loader.messages_loaded.connect(self.finish_history_startup, Qt.QueuedConnection)
+            self.loader.load_failed.connect(self.show_load_failure, Qt.QueuedConnection)
+            # A failed load is shown in the window and tried again until it works
+            self.load_failure_box = None
+            self.load_retry_timer = QTimer(self)
+            self.load_retry_timer.setSingleShot(True)
+            self.load_retry_timer.setInterval(MODEL_LOAD_RETRY_MS)
+            self.load_retry_timer.timeout.connect(self.loader.load_requested)
+            self.loader_thread.start()
+            QApplication.instance().aboutToQuit.connect(self.stop_loader)
+            self.loader.load_requested.emit()
         else:
             print('mps_gui_main.py needs config file prefix, logic prefix, ioc prefix, accel type, and json file path')
             print('try again chump')
 
+    def is_full_display(self):
+        """True for the full display with all of its tabs, False for either CUD"""
+        return self.cud_mode not in ('summary', 'recent')
+
+    def set_tabs_enabled(self, tab_names, enabled):
+        """Enable or disable the main tabs with these widget names"""
+        tab_widget = self.ui.Main_Tab_Widget
+        for tab_name in tab_names:
+            tab_widget.setTabEnabled(tab_widget.indexOf(getattr(self.ui, tab_name)), enabled)
+
+    @Slot(object, object, object)
+    def finish_logic_startup(self, model, config_version, logic_version):
+        """
+        Set up every screen that shows the logic model, once the loader thread has built it.
+        Runs on the GUI thread.
+        """
+        self.hide_load_failure()
+        self.model = model
+        self.config_version = config_version
+        self.logic_version = logic_version
+
+        # Initialize all screens first
+        self.logic_tbl_model = LogicTableModel(self, self.model, self.linactype,
+                                               self.rateList, IOC_PREFIX=self.ioc_prefix)
+        self.delegate = MPSItemDelegate(self)
+
+        if self.cud_mode == 'summary':
+            self.summary_init(is_cud=True)
+        else:
+            self.summary_init(is_cud=False)
+            self.logic_init(self.rateList, self.ioc_prefix)
+            self.fault_init()
+            self.ignore_init(self.rateList, self.ioc_prefix)
+            self.recent_faults_init(rates_list=self.rateList, is_cud=False, accel_type=self.linactype)
+
+        # Current states arrive on the CA callback thread, the mailbox hands only the latest
+        # of them to the logic table model on the GUI thread, a few times a second at most
+        max_rate = CURRENT_STATES_MAX_RATE_CUD if self.cud_mode == 'summary' else CURRENT_STATES_MAX_RATE
+        self.current_states_mailbox = LatestValueMailbox(self.update_current_states, max_rate, self)
+        self.subscriptions.subscribe(self.ioc_prefix + CURRENT_STATES_POSTFIX,
+                                     self.current_states_mailbox.post, run_now=True)
+
+        # Then connect them to PV's or other connections
+        if self.cud_mode == 'summary':
+            self.summ_connections(is_cud=True)
+        else:
+            self.logic_connections(IOC_PREFIX=self.ioc_prefix)
+            self.fault_connections()
+            self.summ_connections(is_cud=False)
+            self.ignore_connections()
+            self.recent_faults_connections(IOC_PREFIX=self.ioc_prefix, is_cud=False)
+            self.set_tabs_enabled(LOGIC_TABS, True)
+
+        # Watch for a newly deployed config or logic version, both PVs usually change together,
+        # so the reload waits for them to settle first
+        self.reloading_versions = None
+        self.version_reload_timer = QTimer(self)
+        self.version_reload_timer.setSingleShot(True)
+        self.version_reload_timer.setInterval(VERSION_RELOAD_DELAY_MS)
+        self.version_reload_timer.timeout.connect(self.reload_models)
+        self.version_retry_timer = QTimer(self)
+        self.version_retry_timer.setSingleShot(True)
+        self.version_retry_timer.setInterval(VERSION_RELOAD_RETRY_MS)
+        self.version_retry_timer.timeout.connect(self.reload_models)
+        self.version_mailbox = LatestValueMailbox(self.version_changed, 1, self)
+        for postfix in (CONFIG_VERSION_POSTFIX, LOGIC_VERSION_POSTFIX):
+            self.subscriptions.subscribe(self.ioc_prefix + postfix, self.version_mailbox.post)
+        # A version deployed while the models were loading changed no PV since subscribing, so check now
+        self.reload_models()
+
+    @Slot(object)
+    def finish_history_startup(self, messageModel):
+        """
+        Set up the History tab, once the loader thread has loaded the first hours of history.
+        Only the full display loads history. Runs on the GUI thread.
+        """
+        self.hide_load_failure()
+        self.messageModel = messageModel
+        self.history_init()
+        self.history_connections()
+        self.set_tabs_enabled(HISTORY_TABS, True)
+
+    @Slot(str)
+    def show_load_failure(self, message):
+        """
+        Tell the user why the display could not finish loading, and load again after a delay.
+        The message box does not block the window, and is reused for every failed attempt.
+        """
+        self.logger.error(f'Display could not finish loading: {message}')
+        if self.load_failure_box is None:
+            self.load_failure_box = QMessageBox(self)
+            self.load_failure_box.setIcon(QMessageBox.Warning)
+            self.load_failure_box.setWindowTitle('MPS Display')
+            self.load_failure_box.setStandardButtons(QMessageBox.Ok)
+            self.load_failure_box.setModal(False)
+        self.load_failure_box.setText(f'The display could not finish loading, '
+                                      f'trying again in {MODEL_LOAD_RETRY_MS // 1000} seconds.')
+        self.load_failure_box.setInformativeText(message)
+        self.load_failure_box.show()
+        self.load_retry_timer.start()
+
+    def hide_load_failure(self):
+        """Close the load failure message once the models it was about are loaded"""
+        if self.load_failure_box is not None:
+            self.load_failure_box.hide()
+
+    def stop_loader(self):
+        """Stop the loader thread before the application exits."""
+        self.loader_thread.quit()
+        self.loader_thread.wait()
+
     def update_current_states(self, value, **kw):
         """
         Update the states shown on the table to the current states from the related PV.
         the parameter 'value' is the array holding all numbers of current states
+        Runs on the GUI thread, through current_states_mailbox
         """
         value = value.astype('int8')
         self.logic_tbl_model.set_current_states(self.linactype, currentStateNumbers=value)
@@ -155,18 +273,141 @@ class MpsGuiDisplay(Display, SummaryUI, FaultsUI, LogicUI, IgnoreUI, HistoryUI,
         self.linactype = 'FACET'
         self.historyWalletKey = 'mps_hist_facet2'
 
-    def getConfigModel(self, IOC_PREFIX: str):
-        configPV = PV(IOC_PREFIX + CONFIG_VERSION_POSTFIX)
-        self.config_version = configPV.get()
+    def version_changed(self, **kw):
+        """Wait for both version PVs to settle, then load the new versions. Runs on the GUI thread"""
+        self.version_reload_timer.start()
+
+    @Slot()
+    def reload_models(self):
+        """Ask the loader thread for the models of the deployed versions, if they are not the ones shown"""
+        if self.reloading_versions is not None:
+            return  # checked again once the running reload is swapped in
+        config_version = self.subscriptions.get_pv(self.ioc_prefix + CONFIG_VERSION_POSTFIX).value
+        logic_version = self.subscriptions.get_pv(self.ioc_prefix + LOGIC_VERSION_POSTFIX).value
+        if config_version is None or logic_version is None:
+            return
+        if (config_version, logic_version) == (self.config_version, self.logic_version):
+            return
+        self.logger.info(f'Loading config version {config_version} and logic version {logic_version}')
+        self.reloading_versions = (config_version, logic_version)
+        self.loader.reload_requested.emit(config_version, logic_version)
+
+    @Slot(object, object)
+    def retry_reload(self, config_version, logic_version):
+        """A new version failed to load, so try the deployed versions again later. Runs on the GUI thread"""
+        self.logger.error(f'Config version {config_version} and logic version {logic_version} could not be loaded, '
+                          f'trying again in {VERSION_RELOAD_RETRY_MS // 1000} seconds')
+        self.reloading_versions = None
+        self.version_retry_timer.start()
+
+    @Slot(object, object, object, object)
+    def swap_logic_model(self, model, config_version, logic_version, diff):
+        """
+        Swap the models of a new config and logic version into every table.
+        Nothing is swapped for a version with the same content, and only the changed rows are rebuilt
+        when no macros or faults were added or removed. Otherwise every table gets one model reset,
+        and the selected rows, filters and scroll positions are kept where the rows still exist.
+        Runs on the GUI thread.
+        """
+        self.reloading_versions = None
+        if diff.is_empty():
+            self.config_version = config_version
+            self.logic_version = logic_version
+        elif not diff.changes_rows() and self.patch_logic_model(model, config_version, logic_version, diff):
+            pass
+        else:
+            self.reset_logic_model(model, config_version, logic_version)
+
+        # The versions may have changed again while this one was loading
+        self.reload_models()
+
+    def patch_logic_model(self, model, config_version, logic_version, diff):
+        """
+        Swap in the models of a new version by rebuilding only the rows that changed,
+        and refresh the selection details in case they show one of them.
+        Returns False if the logic table cannot be patched.
+        """
+        if not self.logic_tbl_model.patch_logic_model(model, self.linactype, diff.changed_macro_numbers()):
+            return False
+        self.model = model
+        self.config_version = config_version
+        self.logic_version = logic_version
+        self.show_latest_current_states()
+
+        if self.is_full_display():
+            self.logicSelectionDetailHelper.mpslogicmodel = model
+            self.ignoreSelection.mpslogicmodel = model
+            self.fault_tbl_model.patch_fault_model(model.configDB, diff.changed_faults)
+            self.recent_states_tbl_model.set_logic_model(model)
+
+            for view, slot in ((self.ui.Logic_Table_View, self.logicSelectionDetailHelper.selected),
+                               (self.ui.Ignored_Logic_Table, self.ignoreSelection.selected),
+                               (self.fault_table_ui, self.fault_selected)):
+                selection = view.selectionModel().selection()
+                if not selection.isEmpty():
+                    slot(selection, QItemSelection())
+        return True
+
+    def reset_logic_model(self, model, config_version, logic_version):
+        """
+        Swap in the models of a new version with one model reset per table,
+        keeping the selected rows, filters and scroll positions where the rows still exist.
+        """
+        full = self.is_full_display()
+        if full:
+            views = ((self.ui.Logic_Table_View, self.logic_tbl_model.numind),
+                     (self.ui.Ignoring_Logic_Table, self.logic_tbl_model.numind),
+                     (self.ui.Ignored_Logic_Table, self.logic_tbl_model.numind),
+                     (self.fault_table_ui, self.fault_tbl_model.num_ind))
+            view_states = [self.save_view_state(view, key_column) for view, key_column in views]
+
+        self.model = model
+        self.config_version = config_version
+        self.logic_version = logic_version
+        self.logic_tbl_model.set_logic_model(model, self.linactype)
+        self.show_latest_current_states()
+
+        if full:
+            self.logicSelectionDetailHelper.mpslogicmodel = model
+            self.ignoreSelection.mpslogicmodel = model
+            self.fault_tbl_model.set_fault_model(model.configDB)
+            self.recent_states_tbl_model.set_logic_model(model)
 
-    def getLogicVersion(self, IOC_PREFIX: str):
-        logicPV = PV(IOC_PREFIX + LOGIC_VERSION_POSTFIX)
-        self.logic_version = logicPV.get()
+            logic_view, ignoring_view, ignored_view, fault_view = (view for view, key_column in views)
+            if not self.restore_view_state(logic_view, self.logic_tbl_model.numind, view_states[0]):
+                self.logicSelectionDetailHelper.details_closed()
+            if not self.restore_view_state(ignoring_view, self.logic_tbl_model.numind, view_states[1]):
+                self.ignored_model.setFilterByColumn(self.logic_tbl_model.numind, 'filter out everything')
+            if not self.restore_view_state(ignored_view, self.logic_tbl_model.numind, view_states[2]):
+                self.ignoreSelection.details_closed()
+            if not self.restore_view_state(fault_view, self.fault_tbl_model.num_ind, view_states[3]):
+                self.details_closed()
 
-    def config_version_change_reset(self, value, **kw):
-        print('insert a version change table reset here, some forced restart of the whole program')
-        self.config_version = value
+    def show_latest_current_states(self):
+        """The macros of a new version start without a current state, so show the latest one right away"""
+        current_states_pv = self.subscriptions.get_pv(self.ioc_prefix + CURRENT_STATES_POSTFIX)
+        if current_states_pv.connected:
+            self.update_current_states(current_states_pv.value)
 
-    def logic_version_change_reset(self, value, **kw):
-        print('insert a version change table reset here, some forced restart of the whole program')
-        self.logic_version = value
+    def save_view_state(self, view, key_column):
+        """The key of the selected row and the scroll position of a table view"""
+        indexes = view.selectionModel().selectedIndexes()
+        key = indexes[0].siblingAtColumn(key_column).data() if indexes else None
+        return key, view.verticalScrollBar().value()
+
+    def restore_view_state(self, view, key_column, state):
+        """
+        Select the row with the saved key again and scroll back to where the view was.
+        Returns False if a row was selected and is gone from the new version.
+        """
+        key, scroll = state
+        found = key is None
+        model = view.model()
+        if key is not None:
+            for row in range(model.rowCount()):
+                if model.index(row, key_column).data() == key:
+                    view.selectRow(row)
+                    found = True
+                    break
+        view.verticalScrollBar().setValue(scroll)
+        return found
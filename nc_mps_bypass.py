@@ -4,11 +4,18 @@ from functools import partial
 from qtpy.QtGui import QIntValidator
 from qtpy.QtCore import (QDateTime, Qt, Slot)
 from qtpy.QtWidgets import (QWidget, QHBoxLayout, QCheckBox, QComboBox, QHeaderView, QTableWidgetItem, QMessageBox)
-from epics import PV
 from pydm import Display
+from pv_subscriptions import PVSubscriptionManager
 import mps_constants as const
 
 
+def unsubscribe_all(subscriptions):
+    """Stop the PV callbacks of a closed bypass window"""
+    manager = PVSubscriptionManager.instance()
+    for subscription in subscriptions:
+        manager.unsubscribe(subscription)
+
+
 class NC_MPS_Bypass(Display):
     """
     author: Evren Keskin
@@ -42,8 +49,10 @@ class NC_MPS_Bypass(Display):
 
     def init_macros(self, macros):
         self.ioc_prefix = macros['IOC_PREFIX']
-        self.byp_ids = PV(self.ioc_prefix + const.BYPASS_FAULT_NUMBERS_POSTFIX)
-        self.byp_durations = PV(self.ioc_prefix + const.BYPASS_SECONDS_POSTFIX)
+        # The PVs are shared with the main display and every other bypass window
+        pvs = PVSubscriptionManager.instance()
+        self.byp_ids = pvs.get_pv(self.ioc_prefix + const.BYPASS_FAULT_NUMBERS_POSTFIX)
+        self.byp_durations = pvs.get_pv(self.ioc_prefix + const.BYPASS_SECONDS_POSTFIX)
 
         self.is_code = macros['DEVICE_IS_CODE'] == 1
         self.device_name = macros['DEVICE_NAME']
@@ -63,9 +72,9 @@ class NC_MPS_Bypass(Display):
             fault_dict['id'] = macros['DEVICE_FAULT_NUMBERS'][i]
             fault_dict['ok_state'] = macros['DEVICE_OK_STATES'][i]
             fault_dict['fault_state'] = macros['DEVICE_FAULTED_STATES'][i]
-            fault_dict['fault_pv'] = PV(fault_dict['pvname'] + const.STATE_IS_OK_POSTFIX)
-            fault_dict['byp_pv'] = PV(fault_dict['pvname'] + const.BYPASS_VALUE_POSTFIX)
-            fault_dict['byp_dur_pv'] = PV(fault_dict['pvname'] + const.BYPASS_DURATION_POSTFIX)
+            fault_dict['fault_pv'] = pvs.get_pv(fault_dict['pvname'] + const.STATE_IS_OK_POSTFIX)
+            fault_dict['byp_pv'] = pvs.get_pv(fault_dict['pvname'] + const.BYPASS_VALUE_POSTFIX)
+            fault_dict['byp_dur_pv'] = pvs.get_pv(fault_dict['pvname'] + const.BYPASS_DURATION_POSTFIX)
             self.fault_states.append(fault_dict)
 
     def init_ui(self):
@@ -110,12 +119,18 @@ class NC_MPS_Bypass(Display):
 
         self.ui.cancel_byp_btn.clicked.connect(partial(self.bypass, cancel=True))
 
+        # The callbacks are dropped when the window is closed, the PVs stay open for the next window
+        pvs = PVSubscriptionManager.instance()
+        subscriptions = []
         for i, fault in enumerate(self.fault_states):
-            fault['fault_pv'].add_callback(partial(self.update_current_val, row=i), run_now=True)
-            fault['byp_dur_pv'].add_callback(self.populate_exp_frame, run_now=True)
+            subscriptions.append(pvs.subscribe(fault['fault_pv'].pvname,
+                                               partial(self.update_current_val, row=i), run_now=True))
+            subscriptions.append(pvs.subscribe(fault['byp_dur_pv'].pvname, self.populate_exp_frame, run_now=True))
 
             if self.is_code:
-                fault['byp_pv'].add_callback(partial(self.update_is_byp, row=i, id=fault['id']), run_now=True)
+                subscriptions.append(pvs.subscribe(fault['byp_pv'].pvname,
+                                                   partial(self.update_is_byp, row=i, id=fault['id']), run_now=True))
+        self.destroyed.connect(partial(unsubscribe_all, subscriptions))
 
     def populate_values_table(self):
         self.comboboxes = []
@@ -11,12 +11,13 @@ cd "$(dirname "${BASH_SOURCE[0]}")"
 usage(){
     echo "LCLS-NC/FACET MPS GUI launcher"
     echo "Usage:" 1>&2
-    echo "  nc_mps_gui.bash [-f | --facet] [ -c | --cud TYPE ] [ -confd | --configdbfile CONFIG_DB_FILE ] [ -logicd | --logicdbfile LOGIC_DB_FILE ]" 1>&2
+    echo "  nc_mps_gui.bash [-f | --facet] [ -c | --cud TYPE ] [ -confd | --configdbfile CONFIG_DB_FILE ] [ -logicd | --logicdbfile LOGIC_DB_FILE ] [ -histd | --historydbfile HISTORY_DB_FILE ]" 1>&2
     echo "" 1>&2
     echo "Examples:" 1>&2
     echo "  nc_mps_gui.bash" 1>&2
     echo "  nc_mps_gui.bash -f" 1>&2
     echo "  nc_mps_gui.bash  --configdbfile ~/database/my_file.db --logicdbfile ~/algorithm/my_other_file.db" 1>&2
+    echo "  nc_mps_gui.bash  --historydbfile ~/history/my_history.sqlite" 1>&2
     echo "For the MPS CUD use:" 1>&2
     echo "  nc_mps_gui.bash  --cud summary" 1>&2
     echo "  nc_mps_gui.bash  -f --cud recent" 1>&2
@@ -34,6 +35,7 @@ IOC_PREFIX='IOC:BSY0:MP01'
 CONFIG_DB_FILE=${EPICS_IOC_TOP}/MpsConfiguration/current/database/
 LOGIC_DB_FILE=${EPICS_IOC_TOP}/MpsConfiguration/current/algorithm/
 RECENT_DB_FILE='dbinteraction/recentStatesDB/recent_states_lcls.sqlite'
+HISTORY_DB_FILE=''
 
 
 while [ $# -gt 0 ]
@@ -51,6 +53,8 @@ do
                                  shift ;;
         -logicd | --logicdbfile) LOGIC_DB_FILE="$2"
                                  shift ;;
+        -histd | --historydbfile) HISTORY_DB_FILE="$2"
+                                  shift ;;
         -h | --help) exit_abnormal ;;
         *) exit_abnormal
     esac
@@ -66,6 +70,12 @@ then
     MACROS+=", CUD=$CUD_MODE"
 fi
 
+# A local history SQLite file replaces the Oracle history database
+if [[ -n $HISTORY_DB_FILE ]]
+then
+    MACROS+=", HISTORY_DB_FILE=$HISTORY_DB_FILE"
+fi
+
 
 pydm --hide-nav-bar --hide-status-bar --hide-menu-bar \
     -m "$MACROS" \
@@ -0,0 +1,225 @@
+import threading
+import time
+from logging import getLogger
+from epics import PV
+from qtpy.QtCore import Qt, QObject, QTimer, Signal, Slot
+
+
+class Subscription:
+    """
+    author: Evren Keskin
+    ===================================================================
+    One consumer of a shared channel, made by PVSubscriptionManager.subscribe.
+    A consumer with a min_interval gets at most one update per min_interval seconds.
+    Updates in between are not lost, the latest of them is delivered
+    once the interval has passed, so the consumer always ends on the newest value.
+    ===================================================================
+    """
+    def __init__(self, pvname, callback, min_interval=0.0):
+        self.pvname = pvname
+        self.callback = callback
+        self.min_interval = min_interval
+        self.last_delivery = 0.0
+        self.pending = None
+        self.timer = None
+        self.active = True
+        self.lock = threading.Lock()
+
+    def offer(self, kw):
+        """Deliver an update now, or keep it as the pending one until min_interval has passed"""
+        with self.lock:
+            if not self.active:
+                return
+            wait = self.last_delivery + self.min_interval - time.monotonic()
+            if wait > 0:
+                self.pending = kw
+                if self.timer is None:
+                    self.timer = threading.Timer(wait, self.deliver_pending)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+            self.last_delivery = time.monotonic()
+        self.deliver(kw)
+
+    def deliver_pending(self):
+        """Deliver the latest update that arrived while the consumer was throttled"""
+        with self.lock:
+            kw, self.pending, self.timer = self.pending, None, None
+            if kw is None or not self.active:
+                return
+            self.last_delivery = time.monotonic()
+        self.deliver(kw)
+
+    def deliver(self, kw):
+        try:
+            self.callback(**kw)
+        except Exception:
+            PVSubscriptionManager.logger.exception(f'Callback of {self.pvname} failed')
+
+    def cancel(self):
+        """Stop all deliveries, including a pending one"""
+        with self.lock:
+            self.active = False
+            self.pending = None
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+
+class SharedChannel:
+    """
+    The one PV of a channel, and the consumers its updates are fanned out to
+    kept is True once the PV has been handed out to read values from,
+    such a channel stays open even when no consumer is subscribed
+    """
+    def __init__(self, pvname):
+        self.consumers = []
+        self.kept = False
+        self.pv = PV(pvname, callback=self.dispatch)
+
+    def dispatch(self, **kw):
+        """Runs on the CA callback thread for every update of the PV"""
+        for consumer in list(self.consumers):
+            consumer.offer(kw)
+
+
+class PVSubscriptionManager:
+    """
+    author: Evren Keskin
+    ===================================================================
+    Owns every channel access PV of the process, one PV and so one monitor per channel,
+    however many parts of the GUI want updates from it.
+    Consumers subscribe a callback to a channel, each with its own throttle,
+    and the updates of the channel are fanned out to all of them.
+    Parts that only read the value of a channel share the same PV through get_pv.
+
+    Use PVSubscriptionManager.instance() for the manager of the process,
+    describe() lists every open channel and its consumers.
+    ===================================================================
+    """
+    logger = getLogger(__name__)
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """The subscription manager of this process, made on first use"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def get_channel(self, pvname):
+        """Get the channel of a PV name, opening it on first use. Call with the lock held"""
+        channel = self.channels.get(pvname)
+        if channel is None:
+            channel = SharedChannel(pvname)
+            self.channels[pvname] = channel
+        return channel
+
+    def get_pv(self, pvname):
+        """Get the shared PV of a channel, to read its value. The channel stays open from then on"""
+        with self.lock:
+            channel = self.get_channel(pvname)
+            channel.kept = True
+            return channel.pv
+
+    def subscribe(self, pvname, callback, min_interval=0.0, run_now=False):
+        """
+        Call callback with the pyepics keyword arguments (pvname, value, ...) on every update of a channel,
+        at most once every min_interval seconds with the latest update.
+        Callbacks run on the CA callback thread, or on a timer thread for throttled updates.
+        With run_now, the callback is also called right away if the channel is already connected.
+        Returns the Subscription to give to unsubscribe.
+        """
+        subscription = Subscription(pvname, callback, min_interval)
+        with self.lock:
+            channel = self.get_channel(pvname)
+            channel.consumers.append(subscription)
+            pv = channel.pv
+
+        if run_now and pv.connected:
+            subscription.offer({'pvname': pv.pvname, 'value': pv.value,
+                                'char_value': pv.char_value, 'timestamp': pv.timestamp})
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop a consumer's updates, closing the channel if nothing else uses it"""
+        subscription.cancel()
+        with self.lock:
+            channel = self.channels.get(subscription.pvname)
+            if channel is None or subscription not in channel.consumers:
+                return
+            channel.consumers.remove(subscription)
+            if channel.consumers or channel.kept:
+                return
+            del self.channels[subscription.pvname]
+        channel.pv.clear_callbacks()
+        channel.pv.disconnect()
+
+    def describe(self):
+        """List every open channel with its number of consumers and whether it is kept for reading"""
+        with self.lock:
+            return [(pvname, len(channel.consumers), channel.kept)
+                    for pvname, channel in sorted(self.channels.items())]
+
+
+class LatestValueMailbox(QObject):
+    """
+    author: Evren Keskin
+    ===================================================================
+    A bridge from channel access callbacks to the GUI thread.
+    The CA callback thread posts every update into the mailbox, which only keeps the latest one.
+    The GUI thread takes it out at most max_rate_hz times a second and calls callback with it,
+    so a burst of updates becomes one model update per frame, always on the GUI thread.
+    post can be given to PVSubscriptionManager.subscribe as the callback.
+    ===================================================================
+    """
+    posted = Signal()
+
+    def __init__(self, callback, max_rate_hz, parent=None):
+        super(LatestValueMailbox, self).__init__(parent)
+        self.callback = callback
+        self.interval = 1.0 / max_rate_hz
+        self.lock = threading.Lock()
+        self.latest = None
+        self.scheduled = False
+        self.last_drain = 0.0
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.drain)
+        self.posted.connect(self.schedule, Qt.QueuedConnection)
+
+    def post(self, **kw):
+        """Keep an update as the latest one, safe to call from any thread"""
+        with self.lock:
+            self.latest = kw
+            if self.scheduled:
+                return  # the waiting drain will take this one instead
+            self.scheduled = True
+        self.posted.emit()
+
+    @Slot()
+    def schedule(self):
+        """Start the drain timer on the GUI thread, waiting out the rest of the current interval"""
+        wait = self.last_drain + self.interval - time.monotonic()
+        self.timer.start(max(0, int(wait * 1000)))
+
+    @Slot()
+    def drain(self):
+        """Take the latest update out of the mailbox and hand it to the callback. Always runs on the GUI thread"""
+        with self.lock:
+            kw, self.latest = self.latest, None
+            self.scheduled = False
+        self.last_drain = time.monotonic()
+        if kw is None:
+            return
+        try:
+            self.callback(**kw)
+        except Exception:
+            PVSubscriptionManager.logger.exception(f'Update of {kw.get("pvname")} failed')
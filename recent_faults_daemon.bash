@@ -14,4 +14,5 @@ python recent_faults_daemon.py ${EPICS_IOC_TOP}/MpsConfiguration/current/databas
     ${EPICS_IOC_TOP}/MpsConfiguration/current/algorithm \
     IOC:BSY0:MP01 \
     dbinteraction/recentStatesDB/recent_states_lcls.sqlite \
-    LCLS
\ No newline at end of file
+    LCLS \
+    --archiveDir dbinteraction/recentStatesDB/archive_lcls
\ No newline at end of file
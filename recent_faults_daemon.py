@@ -1,5 +1,5 @@
 import time
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from argparse import ArgumentParser
 from threading import Lock, Thread
 from epics import PV
@@ -8,7 +8,9 @@ from models.all_logic_model import AllLogicModel
 from models.all_faults_model import ALLFaultsModel
 from models.prepped_macro_state import PreppedMacroState
 from dbinteraction.mps_config import MPSConfig
-from dbinteraction.recentStatesDB.recent_sql import do_single_insert
+from dbinteraction.version_diff import model_digest, read_digest
+from dbinteraction.recentStatesDB.recent_sql import do_single_insert, create_indexes_if_not_exist
+from dbinteraction.recentStatesDB.recent_archive import RecentStatesArchive
 
 
 class RecentFaultsDaemon():
@@ -20,6 +22,7 @@ class RecentFaultsDaemon():
     Each change on it tells us about a change of states
     This program writes to a JSON a log of the recent X number of changes
     Allowing a quick to access list of the recent changes to states
+    If given an archive directory, every change is also kept in daily archive files
 
     =====================================================================
 
@@ -33,6 +36,8 @@ class RecentFaultsDaemon():
         parser.add_argument("IOC_PREFIX")
         parser.add_argument("recentStatesDBPath")
         parser.add_argument("linacType", default="LCLS", choices=["LCLS", "FACET"])
+        parser.add_argument("--archiveDir", default=None)
+        parser.add_argument("--archiveDays", type=int, default=const.RECENT_ARCHIVE_DAYS)
         self.args = parser.parse_args()
 
         self.ioc_pre = self.args.IOC_PREFIX
@@ -43,7 +48,14 @@ class RecentFaultsDaemon():
         self.logicPV.wait_for_connection()
 
         self.resetModel()
+        self.digest = model_digest(self.myLogicDB)
         self.conf = MPSConfig(self.args.recentStatesDBPath)
+        create_indexes_if_not_exist(self.conf.engine)
+
+        self.archive = None
+        self.archive_pruned_day = None
+        if self.args.archiveDir:
+            self.archive = RecentStatesArchive(self.args.archiveDir)
 
         self.queued_states = []
         states_pv = PV(self.ioc_pre + const.CURRENT_STATES_POSTFIX)
@@ -62,13 +74,14 @@ class RecentFaultsDaemon():
             while self.queued_states:
                 with self.lock:
                     self.add_latest_states(*self.queued_states.pop(0))
+            self.prune_archive()
             time.sleep(5)  # 5 seconds wait completely arbitraty, I just want to avoid melting slac servers
         return
 
     def recent_states_check(self, value, **kw):
         if (self.config_version != self.configPV.get() or
            self.logic_version != self.logicPV.get()):
-            self.resetModel()
+            self.reloadModel()
 
         value = value.astype('int8')
 
@@ -114,17 +127,58 @@ class RecentFaultsDaemon():
                 with self.conf.Session() as session:
                     do_single_insert(session=session, **params)
 
+                if self.archive is not None:
+                    self.archive.do_insert(**params)
+
             except KeyError:
                 continue
 
         self.prev_states = new_states
 
+    def prune_archive(self):
+        """
+        Once a day, delete the archive files older than the days to keep
+        """
+        if self.archive is None or self.archive_pruned_day == date.today():
+            return
+        self.archive_pruned_day = date.today()
+        self.archive.remove_partitions_before(self.archive_pruned_day - timedelta(days=self.args.archiveDays))
+
+    def version_filenames(self, config_version, logic_version):
+        """The config and logic database files of a config and logic version"""
+        return (f'{self.args.configPrefix}/{config_version}/mpsdb.sqlite3',
+                f'{self.args.logicPrefix}/{logic_version}/build/mpslogic.sqlite')
+
+    def reloadModel(self):
+        """
+        Diff the newly deployed versions against the loaded ones by their content hashes,
+        the models are only rebuilt if the content of a macro, state or fault changed
+        """
+        config_version = self.configPV.value
+        logic_version = self.logicPV.value
+        digest = read_digest(*self.version_filenames(config_version, logic_version))
+        if digest is None:
+            # Without the versioned files the models load the default database, so diff the files they opened
+            self.resetModel()
+            digest = model_digest(self.myLogicDB)
+            diff = digest.diff(self.digest)
+            print(f'config version {config_version}, logic version {logic_version}: {diff.summary()}')
+        else:
+            diff = digest.diff(self.digest)
+            print(f'config version {config_version}, logic version {logic_version}: {diff.summary()}')
+
+            if diff.is_empty():
+                self.config_version = config_version
+                self.logic_version = logic_version
+            else:
+                self.resetModel()
+        self.digest = digest
+
     def resetModel(self):
         self.config_version = self.configPV.value
         self.logic_version = self.logicPV.value
 
-        configFilename = f'{self.args.configPrefix}/{self.config_version}/mpsdb.sqlite3'
-        logicFilename = f'{self.args.logicPrefix}/{self.logic_version}/build/mpslogic.sqlite'
+        configFilename, logicFilename = self.version_filenames(self.config_version, self.logic_version)
 
         print('resetting recent faults daemon')
         print(configFilename)
@@ -14,4 +14,5 @@ python recent_faults_daemon.py ${EPICS_IOC_TOP}/MpsConfiguration-FACET/current/d
     ${EPICS_IOC_TOP}/MpsConfiguration-FACET/current/algorithm/ \
     IOC:SYS1:MP01 \
     dbinteraction/recentStatesDB/recent_states_facet.sqlite \
-    FACET
\ No newline at end of file
+    FACET \
+    --archiveDir dbinteraction/recentStatesDB/archive_facet
\ No newline at end of file
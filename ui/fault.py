@@ -71,6 +71,7 @@ class FaultsUI:
         self.fault_model.rowsRemoved.connect(self.show_faults_row_count)
         self.fault_model.rowsInserted.connect(self.show_faults_row_count)
         self.fault_model.layoutChanged.connect(self.show_faults_row_count)
+        self.fault_model.modelReset.connect(self.show_faults_row_count)
 
         # Establish connections for the selection details frame
         self.fault_table_ui.selectionModel().selectionChanged.connect(self.fault_selected)
@@ -1,9 +1,9 @@
-from qtpy.QtCore import Qt, Slot
-from qtpy.QtWidgets import QHeaderView, QApplication
+from qtpy.QtCore import Qt, QModelIndex, Slot
+from qtpy.QtWidgets import QHeaderView
 from models.message_table_model import MessageTableModel, MPSSortFilterModel
+from models.overview_table_model import OverviewTableModel
 from PyQt5.QtCore import QTimer, QDateTime
-from functools import partial
-from mps_constants import FROM_1970_TO_1990_IN_SECONDS
+from mps_constants import FROM_1970_TO_1990_IN_SECONDS, SEARCH_DEBOUNCE_MS
 
 
 class HistoryUI():
@@ -46,8 +46,33 @@ class HistoryUI():
         hdr2 = interactiveTable.horizontalHeader()
         hdr2.setSectionResizeMode(QHeaderView.Stretch)
 
+        self.overview_tbl_model = OverviewTableModel(self, self.messageModel)
+
+        self.history_overview_model = MPSSortFilterModel(self)
+        self.history_overview_model.setSourceModel(self.overview_tbl_model)
+
+        overviewTable = self.ui.History_Overview_Table_View
+        overviewTable.setModel(self.history_overview_model)
+        overviewTable.sortByColumn(0, Qt.DescendingOrder)
+
+        hdr3 = overviewTable.horizontalHeader()
+        hdr3.setSectionResizeMode(QHeaderView.Stretch)
+
+        # Only the checked message types are fetched, for both the live and interactive tabs
+        self.history_type_checkboxes = {'BD': self.ui.History_Beam_Destination_Checkbox,
+                                        'BR': self.ui.History_Beam_Rate_Checkbox,
+                                        'BT': self.ui.History_Bypass_Time_Checkbox,
+                                        'BV': self.ui.History_Bypass_Value_Checkbox,
+                                        'F': self.ui.History_Fault_Checkbox}
+        for message_type, checkbox in self.history_type_checkboxes.items():
+            checkbox.setChecked(message_type in self.messageModel.enabled_types)
+
         self.show_history_live_row_count()
         self.show_history_interactive_row_count()
+        self.show_history_overview_count()
+        self.ui.History_Cancel_Button.setEnabled(False)
+        self.ui.History_Search_Progress_Bar.setValue(0)
+        self.history_search_interval = None
 
     def history_connections(self):
         """
@@ -61,6 +86,7 @@ class HistoryUI():
         self.history_live_model.rowsRemoved.connect(self.show_history_live_row_count)
         self.history_live_model.rowsInserted.connect(self.show_history_live_row_count)
         self.history_live_model.layoutChanged.connect(self.show_history_live_row_count)
+        self.history_live_model.modelReset.connect(self.show_history_live_row_count)
 
         # Start a timer for live sql query updates here
         self.timer = QTimer(self)
@@ -70,19 +96,39 @@ class HistoryUI():
         # Connect the freezing button to the list freezing function
         self.ui.Pause_Button.clicked.connect(self.flip_freeze)
 
+        for checkbox in self.history_type_checkboxes.values():
+            checkbox.stateChanged.connect(self.update_history_types)
+
         # Establish connections for showing the row count
         self.history_interactive_model.rowsRemoved.connect(self.show_history_interactive_row_count)
         self.history_interactive_model.rowsInserted.connect(self.show_history_interactive_row_count)
         self.history_interactive_model.layoutChanged.connect(self.show_history_interactive_row_count)
+        self.history_interactive_model.modelReset.connect(self.show_history_interactive_row_count)
 
         # Interactive Tab Setup:
-        # Establish connection for the name text search filtering
-        self.ui.Interactive_Search_Line_Edit.textChanged.connect(
-            partial(self.history_interactive_model.setFilterByColumn, 1))
+        # The text search runs against the history cache's full text index, not the loaded rows,
+        # so it waits for a pause in typing before searching the last time range again
+        self.history_search_timer = QTimer(self)
+        self.history_search_timer.setSingleShot(True)
+        self.history_search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.history_search_timer.timeout.connect(self.search_interval_text)
+        self.ui.Interactive_Search_Line_Edit.textChanged.connect(lambda text: self.history_search_timer.start())
 
         # Establish connection to search by time interval from calendars
         self.ui.History_Search_Button.clicked.connect(self.update_interval_table)
 
+        # Searches run in chunks on their own thread, show how far along they are and allow cancelling them
+        self.interactive_message_tbl_model.search_progress.connect(self.show_history_search_progress)
+        self.interactive_message_tbl_model.search_done.connect(self.finish_interval_search)
+        self.ui.History_Cancel_Button.clicked.connect(self.interactive_message_tbl_model.cancel_interactive)
+
+        # Overview Tab Setup:
+        # The overview of the searched times is counted by the history database,
+        # double-clicking one of its rows searches that hour of that device in the interactive tab
+        self.ui.History_Overview_Button.clicked.connect(self.update_overview_table)
+        self.overview_tbl_model.modelReset.connect(self.show_history_overview_count)
+        self.ui.History_Overview_Table_View.doubleClicked.connect(self.drill_into_overview)
+
     @Slot()
     def flip_freeze(self):
         if self.timer.isActive():
@@ -95,21 +141,40 @@ class HistoryUI():
 
     @Slot()
     def update_live_table(self):
+        # Only starts a poll on the poller thread, the row count updates when its rows are added
         self.live_message_tbl_model.update_live()
-        self.show_history_live_row_count()
-
-    @Slot()
-    def update_interval_table(self):
-
-        # Change the cursor to a waiting icon, depending on SQL query period the wait can take a lot of time
-        QApplication.setOverrideCursor(Qt.WaitCursor)
 
+    def get_chosen_interval(self):
+        """Get the start and end times chosen in the interactive tab, in seconds since 1990"""
         startValue = QDateTime.toSecsSinceEpoch(self.ui.History_Start_Date_Time_Edit.dateTime())
         endValue = QDateTime.toSecsSinceEpoch(self.ui.History_End_Date_Time_Edit.dateTime())
 
         # Adjust for 1990
         startValue -= FROM_1970_TO_1990_IN_SECONDS
         endValue -= FROM_1970_TO_1990_IN_SECONDS
+        return startValue, endValue
+
+    @Slot()
+    def update_history_types(self):
+        """
+        Fetch only the checked message types from now on.
+        The live messages are reloaded and the last search and overview are run again with just those types,
+        the types that stay checked come from the history cache
+        """
+        message_types = [message_type for message_type, checkbox in self.history_type_checkboxes.items()
+                         if checkbox.isChecked()]
+        self.messageModel.set_enabled_types(message_types)
+        self.live_message_tbl_model.reload_live()
+        self.search_interval_text()
+        self.overview_tbl_model.refresh_overview()
+
+    @Slot()
+    def update_interval_table(self):
+        """
+        Start a search of the chosen time range.
+        Its rows are shown chunk by chunk as they arrive, and the GUI stays usable the whole time
+        """
+        startValue, endValue = self.get_chosen_interval()
 
         # A valid search has some rules to for the times
         # Start time has to be less than the end time
@@ -117,10 +182,53 @@ class HistoryUI():
         # NO MESSAGES FROM THE FUTURE, SEND THOSE BACK TO THE FUTURE
 
         if startValue <= endValue:  # startValue is valid somehow and endValue is valid somehow
-            self.interactive_message_tbl_model.update_interactive(startValue, endValue)
-            self.show_history_interactive_row_count()
+            self.history_search_interval = (startValue, endValue)
+            self.search_interval_text()
+
+    @Slot()
+    def search_interval_text(self):
+        """Search the last searched time range again for the current search text"""
+        if self.history_search_interval is None:
+            return  # nothing searched yet, the text is used by the first search
+        self.history_search_timer.stop()
+        startValue, endValue = self.history_search_interval
+        self.ui.History_Cancel_Button.setEnabled(True)
+        self.interactive_message_tbl_model.update_interactive(
+            startValue, endValue, self.ui.Interactive_Search_Line_Edit.text().strip())
+
+    @Slot()
+    def update_overview_table(self):
+        """Count the messages of the chosen time range per hour and device, and show the counts"""
+        startValue, endValue = self.get_chosen_interval()
+        if startValue < endValue:
+            self.overview_tbl_model.update_overview(startValue, endValue)
+            self.ui.Live_Interactive_Tab_Widget.setCurrentWidget(self.ui.Overview)
+
+    @Slot(QModelIndex)
+    def drill_into_overview(self, index: QModelIndex):
+        """Search the hour of the double-clicked overview row for its device in the interactive tab"""
+        row = self.history_overview_model.mapToSource(index).row()
+        startValue, endValue, device_name = self.overview_tbl_model.get_bucket(row)
+
+        self.ui.History_Start_Date_Time_Edit.setDateTime(
+            QDateTime.fromSecsSinceEpoch(startValue + FROM_1970_TO_1990_IN_SECONDS))
+        self.ui.History_End_Date_Time_Edit.setDateTime(
+            QDateTime.fromSecsSinceEpoch(endValue + FROM_1970_TO_1990_IN_SECONDS))
+        self.ui.Interactive_Search_Line_Edit.setText(device_name)
+
+        self.history_search_interval = (startValue, endValue)
+        self.search_interval_text()
+        self.ui.Live_Interactive_Tab_Widget.setCurrentWidget(self.ui.Interactive)
 
-        QApplication.restoreOverrideCursor()
+    @Slot(int, int)
+    def show_history_search_progress(self, covered, total):
+        """Show how much of the searched time range has been fetched so far"""
+        self.ui.History_Search_Progress_Bar.setValue(100 * covered // total if total else 100)
+
+    @Slot()
+    def finish_interval_search(self):
+        """A search finished or was cancelled, so there is nothing left to cancel"""
+        self.ui.History_Cancel_Button.setEnabled(False)
 
     @Slot()
     def show_history_live_row_count(self):
@@ -140,3 +248,10 @@ class HistoryUI():
         rows = self.history_interactive_model.rowCount()
         total = len(self.messageModel.interactiveMessages)
         self.ui.Interactive_Number_Filters_Label.setText(f"Displaying {rows} / {total} Messages")
+
+    @Slot()
+    def show_history_overview_count(self):
+        """Show how many rows and messages the overview counted."""
+        rows = self.overview_tbl_model.rowCount()
+        total = self.overview_tbl_model.message_count()
+        self.ui.Overview_Number_Label.setText(f"Displaying {rows} device hours of {total} Messages")
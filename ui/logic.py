@@ -80,6 +80,7 @@ class LogicUI():
         self.logic_model.rowsRemoved.connect(self.show_row_count)
         self.logic_model.rowsInserted.connect(self.show_row_count)
         self.logic_model.layoutChanged.connect(self.show_row_count)
+        self.logic_model.modelReset.connect(self.show_row_count)
 
         # Establish connection for the name text search filtering
         self.ui.Logic_Search_Line_Edit.textChanged.connect(partial(self.logicTextSearch))
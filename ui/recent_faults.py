@@ -1,9 +1,8 @@
-from qtpy.QtCore import (Slot, QPoint)
+from qtpy.QtCore import (Slot, QPoint, QTimer)
 from qtpy.QtWidgets import (QHeaderView, QAction, QMenu, QTableView)
 from models.recent_table_model import RecentTableModel, MPSSortFilterModel, MPSItemDelegate
-from functools import partial
-from epics import PV
-from mps_constants import CURRENT_STATES_POSTFIX, RECENT_FAULTS_MAX
+from pv_subscriptions import PVSubscriptionManager
+from mps_constants import CURRENT_STATES_POSTFIX, RECENT_FAULTS_UPDATE_INTERVAL, SEARCH_DEBOUNCE_MS
 
 
 class RecentFaultsUI():
@@ -58,37 +57,44 @@ class RecentFaultsUI():
         Archive connections allows for the table to update with current state accuracy
         """
 
+        # Share the current states channel with the logic tables, to check for recent states DB changes
+        # A daemon process in another parallel program will update the DB with PV changes
+        subscriptions = PVSubscriptionManager.instance()
         if not is_cud:
-            # Start a PV cchannel to check for JSON file changes
-            # A daemon process in another parallel program will update the JSON file with PV changes
-            self.recentFaultsUpdatePV = PV(IOC_PREFIX + CURRENT_STATES_POSTFIX, callback=self.update_table)
+            self.recentFaultsSubscription = subscriptions.subscribe(
+                IOC_PREFIX + CURRENT_STATES_POSTFIX, self.update_table, min_interval=RECENT_FAULTS_UPDATE_INTERVAL)
             # Establish connections for showing the row count
             self.recent_faults_model.rowsRemoved.connect(self.show_recent_faults_row_count)
             self.recent_faults_model.rowsInserted.connect(self.show_recent_faults_row_count)
             self.recent_faults_model.layoutChanged.connect(self.show_recent_faults_row_count)
+            self.recent_faults_model.modelReset.connect(self.show_recent_faults_row_count)
             # Establish connection for the name text search filtering
-            self.ui.Recent_Fault_Search_Line_Edit.textChanged.connect(
-                partial(self.filter_recent_faults))
+            # The search runs in the recent states DB, so it waits for the user to stop typing
+            self.recent_search_timer = QTimer(self)
+            self.recent_search_timer.setSingleShot(True)
+            self.recent_search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+            self.recent_search_timer.timeout.connect(self.filter_recent_faults)
+            self.ui.Recent_Fault_Search_Line_Edit.textChanged.connect(lambda text: self.recent_search_timer.start())
             # Establish connections for the context menu and its action.
             self.ui.Recent_Faults_View.customContextMenuRequested.connect(
                 self.recent_fault_custom_context_menu)
             self.recent_action.triggered.connect(self.recent_fault_select)
         else:
-            # Start a PV cchannel to check for JSON file changes
-            # A daemon process in another parallel program will update the JSON file with PV changes
-            self.recentFaultsUpdatePV = PV(IOC_PREFIX + CURRENT_STATES_POSTFIX, callback=self.update_table_cud)
+            self.recentFaultsSubscription = subscriptions.subscribe(
+                IOC_PREFIX + CURRENT_STATES_POSTFIX, self.update_table_cud, min_interval=RECENT_FAULTS_UPDATE_INTERVAL)
 
     @Slot()
-    def filter_recent_faults(self, text):
-        self.recent_faults_model.setFilterByColumn(1, text)
+    def filter_recent_faults(self):
+        self.recent_states_tbl_model.set_search_text(self.ui.Recent_Fault_Search_Line_Edit.text())
 
     @Slot()
     def update_table(self, **kw):
         """
         Use the sqlite db file path that the UI was launched with to update the table data
+        This runs on the PV callback thread, so it only queues a load on the loader thread,
+        the row count is refreshed by the model signals once the rows arrive
         """
         self.recent_states_tbl_model.set_data()
-        self.show_recent_faults_row_count()
 
     @Slot()
     def update_table_cud(self, **kw):
@@ -104,7 +110,8 @@ class RecentFaultsUI():
         count at the bottom of the tab.
         """
         rows = self.recent_faults_model.rowCount()
-        self.ui.Recent_Faults_Number_Filters_Label.setText(f"Displaying {rows} / {RECENT_FAULTS_MAX} Recent Faults")
+        total = self.recent_states_tbl_model.total_count
+        self.ui.Recent_Faults_Number_Filters_Label.setText(f"Displaying {rows} / {total} Recent Faults")
 
     @Slot(QPoint)
     def recent_fault_custom_context_menu(self, pos: QPoint):